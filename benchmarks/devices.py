@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Simulated network elements for the benchmark. Every device answers the prompts
+and commands the modules in functions/ expect and keeps a small in-memory
+filesystem served over SFTP. Output size and latency of every command are configurable
+"""
+import io
+import re
+import time
+import fnmatch
+import hashlib
+import tarfile
+import datetime
+import posixpath
+import threading
+
+# Base line of the generated configuration repeated up to the requested size
+CONFIG_LINE = 'interface GigabitEthernet0/{} description benchmark-line-{:08d}\n'
+
+
+def generate_text(hostname, size, line=CONFIG_LINE):
+	"""Return deterministic text of given size for the host - same on every run"""
+	lines = []
+	length = 0
+	index = 0
+	header = '! Configuration of {}\n'.format(hostname)
+	lines.append(header)
+	length += len(header)
+	while length < size:
+		text = line.format(index % 48, index)
+		lines.append(text)
+		length += len(text)
+		index += 1
+	return ''.join(lines)[:max(size, len(header))]
+
+
+class Session:
+	"""State of a single interactive shell - prompt mode and logged in user"""
+
+	def __init__(self, username):
+		self.username = username
+		self.mode = 'exec'
+
+
+class Device:
+	"""
+	Base of the simulated node. Subclasses define prompts of each CLI mode
+	and command handlers, files are kept as REMOTE_PATH:bytes
+	"""
+
+	def __init__(self, hostname, latency=0.0, config_size=64 * 1024, license_days=365):
+		self.hostname = hostname
+		self.latency = latency
+		self.config_size = config_size
+		self.license_date = datetime.date.today() + datetime.timedelta(days=license_days)
+		self.files = {}
+		self.lock = threading.Lock()
+		self._config = None
+
+	def config(self):
+		"""Return configuration text of the device, generated once"""
+		if self._config is None:
+			self._config = generate_text(self.hostname, self.config_size)
+		return self._config
+
+	def prompt(self, session):
+		"""Return prompt of the session's current mode"""
+		raise NotImplementedError
+
+	def handle(self, session, command):
+		"""Return output of the interactive command, may change session mode"""
+		return self.execute(command, session.username)[0].decode('utf-8')
+
+	def execute(self, command, username):
+		"""Return output and exit status of the command run over exec channel"""
+		return ('{}: command not found\n'.format(command.split()[0] if command else '')).encode('utf-8'), 127
+
+	def wait(self):
+		"""Simulate processing time of the command on the node"""
+		if self.latency:
+			time.sleep(self.latency)
+
+	def put_file(self, path, data):
+		with self.lock:
+			self.files[path] = data.encode('utf-8') if isinstance(data, str) else data
+
+	def get_file(self, path):
+		with self.lock:
+			return self.files.get(path)
+
+	def remove_file(self, path):
+		with self.lock:
+			self.files.pop(path, None)
+
+
+class IOSDevice(Device):
+	"""Cisco IOS switch - show commands, running config printed to terminal"""
+
+	def prompt(self, session):
+		return '{}#'.format(self.hostname)
+
+	def handle(self, session, command):
+		if command == 'terminal length 0' or command == '':
+			return ''
+		if command == 'show version':
+			return 'Cisco IOS Software, C2960X Software (C2960X-UNIVERSALK9-M), Version 15.2(7)E3\n{} uptime is 1 year'.format(self.hostname)
+		if command == 'show inventory':
+			return 'NAME: "1", DESCR: "WS-C2960X-48TS-L"\nPID: WS-C2960X-48TS-L  , VID: V05  , SN: FOC0000X000'
+		if command == 'show running-config':
+			return 'Building configuration...\n' + self.config()
+		return '% Invalid input detected at \'^\' marker.'
+
+
+class StarOSDevice(Device):
+	"""Cisco StarOS vEPC - config saved to /sftp/ and downloaded over SFTP"""
+
+	def prompt(self, session):
+		return '[local]{}#'.format(self.hostname)
+
+	def license(self):
+		# Month, day & year are 3rd, 4th and 7th word of the line with 'Expire'
+		return ('Key Information (installed key):\n  Comment           vEPC license\n'
+			'  Session Expire {} 00:00:00 UTC {}\n'.format(self.license_date.strftime('%B %d'), self.license_date.year))
+
+	def handle(self, session, command):
+		if command == '':
+			return ''
+		if command == 'show version':
+			return 'Active Software:\n  Image Version:                21.28.0\n  Image Build Number:           80000'
+		if command == 'show hardware':
+			return 'Card 1:\n  Card Type               : Control Function Virtual Card'
+		if command.startswith('save configuration '):
+			self.put_file(command.split()[2], self.config())
+			return ''
+		if command.startswith('delete '):
+			self.remove_file(command.split()[1])
+			return ''
+		return self.execute(command, session.username)[0].decode('utf-8')
+
+	def execute(self, command, username):
+		if command == 'show license information':
+			return self.license().encode('utf-8'), 0
+		return super().execute(command, username)
+
+
+class EPGDevice(Device):
+	"""Ericsson EPG - shell for version, oam-cli for 1.X config, config mode for 2.X config"""
+
+	VERSION = '2.14.0'
+	SFTP_PATH = '/flash/'
+
+	def prompt(self, session):
+		if session.mode == 'bash':
+			return 'bash-4.2$ '
+		if session.mode == 'oam':
+			return '{}@{}>'.format(session.username, self.hostname)
+		if session.mode == 'config':
+			return '{}(config)#'.format(self.hostname)
+		return '[local]{}#'.format(self.hostname)
+
+	def handle(self, session, command):
+		if command == '':
+			return ''
+		if command == 'start shell':
+			session.mode = 'bash'
+			return ''
+		if command == 'start oam-cli':
+			session.mode = 'oam'
+			return ''
+		if command == 'config':
+			session.mode = 'config'
+			return ''
+		if command == 'exit':
+			session.mode = 'exec'
+			return ''
+		if session.mode == 'bash' and command.startswith('show_epg_version'):
+			return 'EPG software version is {}'.format(self.VERSION)
+		if session.mode == 'oam' and command == 'show-config':
+			return self.config()
+		if session.mode == 'config' and command.startswith('save '):
+			self.put_file(self.SFTP_PATH + command.split()[1], self.config())
+			return ''
+		if command.startswith('delete '):
+			self.remove_file(self.SFTP_PATH + command.split()[1])
+			return ''
+		return self.execute(command, session.username)[0].decode('utf-8')
+
+
+class EPG1Device(EPGDevice):
+	VERSION = '1.12.0'
+
+
+class MKDevice(Device):
+	"""Ericsson MK - config exported to user's home folder and downloaded over SFTP"""
+
+	EXPORT_FILE = 'ConfigFile_from_export'
+
+	def prompt(self, session):
+		return '=== {} [active] ANCB ~ #'.format(self.hostname)
+
+	def home(self, username):
+		return '/Core/home/{}/'.format(username)
+
+	def handle(self, session, command):
+		if command == '':
+			return ''
+		if command == 'gsh get_ne':
+			return 'NeName        : {}\nSoftwareLevel : MK_R1(5.0.1)'.format(self.hostname)
+		if command == 'gsh export_config_active':
+			self.put_file(self.home(session.username) + self.EXPORT_FILE, self.config())
+			return 'Export finished'
+		if command.startswith('rm '):
+			self.remove_file(self.home(session.username) + command.split()[1])
+			return ''
+		return self.execute(command, session.username)[0].decode('utf-8')
+
+
+class BINDDevice(Device):
+	"""
+	Bind DNS server - named.conf and zone files in /var/named/,
+	checksums and tar archive are produced over exec channel
+	"""
+
+	ROOT = '/var/named/'
+
+	def __init__(self, hostname, latency=0.0, config_size=16 * 1024, license_days=365, zones=50):
+		super().__init__(hostname, latency, config_size, license_days)
+		self.put_file(self.ROOT + 'named.conf', generate_text(hostname, config_size))
+		for index in range(zones):
+			self.put_file(self.ROOT + 'zones/zone.{}.local'.format(index), generate_text('zone{}'.format(index), config_size))
+		for folder in ['priv1', 'priv2']:
+			for index in range(max(1, zones // 10)):
+				self.put_file('{}zones/private/{}/{}.{}.local'.format(self.ROOT, folder, folder, index),
+					generate_text('{}{}'.format(folder, index), config_size))
+
+	def prompt(self, session):
+		return '[root@{} ~]# '.format(self.hostname)
+
+	def folder_files(self, path, pattern='*'):
+		"""Return FILE_NAME:data of files directly in the folder matching the pattern"""
+		path = path.rstrip('/') + '/'
+		with self.lock:
+			return {name[len(path):]: data for name, data in self.files.items()
+				if name.startswith(path) and '/' not in name[len(path):] and fnmatch.fnmatch(name[len(path):], pattern)}
+
+	def execute(self, command, username):
+		match = re.match(r"\[ -d (\S+) \] \|\| exit 0; cd \S+ && find \. -maxdepth 1 -type f -name '(\S+)' -exec sha256sum \{\} \+$", command)
+		if match:
+			files = self.folder_files(*match.groups())
+			lines = ['{}  ./{}\n'.format(hashlib.sha256(data).hexdigest(), name) for name, data in sorted(files.items())]
+			return ''.join(lines).encode('utf-8'), 0
+		match = re.match(r'tar -czf - -C (\S+) (.+)$', command)
+		if match:
+			return self.archive(match.group(1), match.group(2).split()), 0
+		return super().execute(command, username)
+
+	def archive(self, root, names):
+		"""Return gzip compressed tar of given files and folders relative to root"""
+		root = root.rstrip('/') + '/'
+		buffer = io.BytesIO()
+		with self.lock:
+			files = sorted(self.files.items())
+		with tarfile.open(fileobj=buffer, mode='w:gz') as tar:
+			for path, data in files:
+				relative = path[len(root):]
+				if path.startswith(root) and any(relative == name or relative.startswith(name + '/') for name in names):
+					info = tarfile.TarInfo(relative)
+					info.size = len(data)
+					tar.addfile(info, io.BytesIO(data))
+		return buffer.getvalue()
+
+
+# Device class of every simulated vendor
+DEVICES = {
+	'ios': IOSDevice,
+	'staros': StarOSDevice,
+	'epg1': EPG1Device,
+	'epg2': EPGDevice,
+	'mk': MKDevice,
+	'bind': BINDDevice,
+}
+
+
+def normalize_path(path):
+	"""Return absolute normalized remote path"""
+	return posixpath.normpath('/' + path.lstrip('/'))
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the backup pipeline against simulated devices - no real node is contacted.
+Simulator and the measured scenario run in separate processes, so peak RSS and CPU
+time reported for the scenario belong to the pipeline only. Peak RSS is the highest
+RSS of the scenario process since its start, so every round reports the cumulative
+peak of all rounds so far, not its own peak.
+
+Usage (from repository root):
+	python -m benchmarks.run config --vendor staros --hosts 100 --workers 16 --rounds 2
+	python -m benchmarks.run dns --hosts 20 --zones 200
+	python -m benchmarks.run license --hosts 500 --license-days 10
+	python -m benchmarks.run collect --hosts 100
+"""
+import os
+import sys
+import json
+import time
+import queue
+import types
+import argparse
+import resource
+import tempfile
+import multiprocessing
+
+# Node type (see functions/registry.py) driven for every simulated vendor
+NODE_TYPES = {
+	'ios': 'switch',
+	'staros': 'vepc',
+	'epg1': 'epg1',
+	'epg2': 'epg2',
+	'mk': 'mk',
+	'bind': 'dns',
+}
+# Scenario: vendor used if not given
+DEFAULT_VENDORS = {
+	'config': 'staros',
+	'dns': 'bind',
+	'license': 'staros',
+	'collect': 'staros',
+}
+# Vendors with license check supported by their node type
+LICENSE_VENDORS = ['staros']
+# Seconds between checks of the scenario process while waiting for its results
+RESULTS_POLL = 5
+# Columns of the printed report
+REPORT_ROW = '{:<8} {:<7} {:>5} {:>6} {:>9} {:>10} {:>8} {:>6} {:>14}  {}'
+
+
+def run_simulator(options, hosts_queue, stop_event):
+	"""Process running simulated devices until stop_event is set"""
+	from benchmarks.simulator import Simulator, build_devices
+	kwargs = {'zones': options.zones} if options.vendor == 'bind' else {}
+	devices = build_devices(options.vendor, options.hosts, options.latency, options.config_size,
+		options.license_days, **kwargs)
+	with Simulator(devices, options.port) as simulator:
+		hosts_queue.put(simulator.hosts())
+		stop_event.wait()
+
+def redirect_paths(git_path, tmp_path):
+	"""
+	Function that points already imported modules in functions/ to benchmark folders
+	instead of /git/config/ and /tmp/ - paths are imported by value in every module
+	"""
+	for name, module in list(sys.modules.items()):
+		if name == 'functions' or name.startswith('functions.'):
+			if hasattr(module, 'GIT_PATH'):
+				module.GIT_PATH = git_path
+			if hasattr(module, 'TMP_PATH'):
+				module.TMP_PATH = tmp_path
+			if hasattr(module, 'INDEX_PATH'):
+				module.INDEX_PATH = git_path + '.git/phoenix-hash-index.json'
+			if hasattr(module, 'BREAKER_PATH'):
+				module.BREAKER_PATH = git_path + '.git/phoenix-breaker.json'
+
+def run_scenario(options, hosts, results_queue):
+	"""Process driving the pipeline function of the scenario over simulated hosts"""
+	import functions.common as common
+	from functions.ssh_pool import SSH_POOL
+	from functions.variables import USERNAME, PASSWORD, ARTIFACT_CONFIG, ARTIFACT_LICENSE
+	from functions.registry import load_node_type
+	from functions.license import expiring
+
+	node_type = load_node_type(NODE_TYPES[options.vendor])
+	work_dir = tempfile.TemporaryDirectory(prefix='phoenix-bench-')
+	git_path = work_dir.name + '/git/'
+	tmp_path = work_dir.name + '/tmp/'
+	for path in [git_path + '.git/', tmp_path]:
+		os.makedirs(path, exist_ok=True)
+	redirect_paths(git_path, tmp_path)
+	SSH_POOL.port = options.port
+
+	if options.scenario == 'dns':
+		# DNS sync mode is passed to save_config instead of DNS_SYNC_MODE
+		dns_save_config = node_type.save_config
+		node_type = types.SimpleNamespace(**vars(node_type))
+		node_type.save_config = lambda *args: dns_save_config(*args, mode=options.dns_mode)
+
+	rounds = []
+	for _ in range(options.rounds):
+		usage = resource.getrusage(resource.RUSAGE_SELF)
+		start = time.perf_counter()
+		if options.scenario == 'config':
+			output = common.config_backup(node_type, hosts, USERNAME, PASSWORD, options.workers)
+		elif options.scenario == 'dns':
+			output = common.dns_backup(node_type, hosts, USERNAME, PASSWORD, options.workers)
+		elif options.scenario == 'collect':
+			# Config backup and license check within single login to every host
+			output = common.collect_artifacts(node_type, hosts, USERNAME, PASSWORD,
+				[ARTIFACT_CONFIG, ARTIFACT_LICENSE], options.workers, cache={})
+		else:
+			output = common.fleet_license_scan([(node_type, hosts)], USERNAME, PASSWORD, options.workers)
+		wall = time.perf_counter() - start
+		end_usage = resource.getrusage(resource.RUSAGE_SELF)
+		cpu = (end_usage.ru_utime - usage.ru_utime) + (end_usage.ru_stime - usage.ru_stime)
+		if options.scenario == 'license':
+			# License scan returns records of hosts with checked license
+			statuses = {'checked': len(output), 'alerts': len(expiring(output))}
+		else:
+			statuses = {}
+			for result in output:
+				statuses[result.status] = statuses.get(result.status, 0) + 1
+		rounds.append({
+			'hosts': len(hosts),
+			'statuses': statuses,
+			'wall_seconds': round(wall, 3),
+			'hosts_per_second': round(len(hosts) / wall, 2) if wall else None,
+			'cpu_seconds': round(cpu, 3),
+			'cpu_percent': round(100 * cpu / wall, 1) if wall else None,
+			# ru_maxrss is in KiB on Linux and covers the whole process lifetime, not the round only
+			'cumulative_peak_rss_mib': round(end_usage.ru_maxrss / 1024, 1),
+		})
+	SSH_POOL.close_all()
+	work_dir.cleanup()
+	results_queue.put(rounds)
+
+def benchmark(options):
+	"""
+	Function that runs the scenario against simulated devices
+
+	Args:
+		options:	parsed command line arguments
+
+	Returns:
+		list of dictionaries with results of every round
+	"""
+	context = multiprocessing.get_context('spawn')
+	hosts_queue = context.Queue()
+	results_queue = context.Queue()
+	stop_event = context.Event()
+	simulator = context.Process(target=run_simulator, args=(options, hosts_queue, stop_event), daemon=True)
+	simulator.start()
+	try:
+		hosts = hosts_queue.get(timeout=120)
+		scenario = context.Process(target=run_scenario, args=(options, hosts, results_queue))
+		scenario.start()
+		rounds = wait_for_results(scenario, results_queue)
+		scenario.join()
+	finally:
+		stop_event.set()
+		simulator.join(10)
+	return rounds
+
+def wait_for_results(scenario, results_queue):
+	"""
+	Function that waits for results of the scenario process. Crashed process
+	does not put its results to the queue, so its exit is checked periodically
+
+	Args:
+		scenario:		process running run_scenario()
+		results_queue:	queue the results are put to
+
+	Returns:
+		list of dictionaries with results of every round
+	"""
+	while True:
+		try:
+			return results_queue.get(timeout=RESULTS_POLL)
+		except queue.Empty:
+			# Results put just before the exit are already in the queue
+			if scenario.exitcode is not None and results_queue.empty():
+				raise RuntimeError('Scenario process exited with code {} without results'.format(scenario.exitcode))
+
+def print_report(options, rounds):
+	"""Print results of every round as table"""
+	print(REPORT_ROW.format('scenario', 'vendor', 'round', 'hosts', 'wall [s]',
+		'hosts/s', 'cpu [s]', 'cpu %', 'peak rss [MiB]', 'results'))
+	for index, result in enumerate(rounds, 1):
+		statuses = ' '.join('{}={}'.format(status, count) for status, count in sorted(result['statuses'].items()))
+		print(REPORT_ROW.format(options.scenario, options.vendor, index, result['hosts'],
+			result['wall_seconds'], result['hosts_per_second'], result['cpu_seconds'],
+			result['cpu_percent'], result['cumulative_peak_rss_mib'], statuses))
+
+def parse_args(args=None):
+	parser = argparse.ArgumentParser(description='Benchmark of backup pipeline against simulated devices')
+	parser.add_argument('scenario', choices=sorted(DEFAULT_VENDORS), help='pipeline function to drive')
+	parser.add_argument('--vendor', choices=sorted(NODE_TYPES), help='simulated vendor (default by scenario)')
+	parser.add_argument('--hosts', type=int, default=50, help='number of simulated hosts (default 50)')
+	parser.add_argument('--workers', type=int, default=16, help='hosts processed at the same time (default 16)')
+	parser.add_argument('--rounds', type=int, default=2, help='runs over the same hosts, first one is cold (default 2)')
+	parser.add_argument('--latency', type=float, default=0.0, help='seconds each device waits before answering a command')
+	parser.add_argument('--config-size', type=int, default=64 * 1024, help='size of generated configs in bytes')
+	parser.add_argument('--zones', type=int, default=50, help='number of zone files of each DNS host (default 50)')
+	parser.add_argument('--dns-mode', default='incremental', choices=['full', 'incremental', 'archive'],
+		help='DNS files synchronization mode (default incremental)')
+	parser.add_argument('--license-days', type=int, default=365, help='days till simulated licenses expire')
+	parser.add_argument('--port', type=int, default=2222, help='port of simulated SSH servers (default 2222)')
+	parser.add_argument('--json', help='write results to given JSON file')
+	options = parser.parse_args(args)
+	if options.vendor is None:
+		options.vendor = DEFAULT_VENDORS[options.scenario]
+	if options.scenario == 'dns' and options.vendor != 'bind':
+		parser.error('dns scenario requires bind vendor')
+	if options.scenario == 'license' and options.vendor not in LICENSE_VENDORS:
+		parser.error('license scenario requires one of vendors: ' + ', '.join(LICENSE_VENDORS))
+	return options
+
+def main(args=None):
+	options = parse_args(args)
+	rounds = benchmark(options)
+	print_report(options, rounds)
+	if options.json:
+		with open(options.json, 'w') as f:
+			json.dump({'options': vars(options), 'rounds': rounds}, f, indent=2)
+
+
+if __name__ == '__main__':
+	main()
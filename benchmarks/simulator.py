@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+SSH/SFTP stand-in servers for the simulated devices. Every device listens on its own
+loopback address (127.42.X.Y) with the same port, so the modules in functions/ connect
+to it exactly as to a real node. Authentication accepts any password
+"""
+import os
+import io
+import stat
+import socket
+import logging
+import selectors
+import threading
+import paramiko
+
+from benchmarks.devices import Session, DEVICES, normalize_path
+
+# First two octets of loopback addresses of the simulated devices
+ADDRESS_PREFIX = '127.42.'
+# Default port of the simulated SSH servers
+DEFAULT_PORT = 2222
+# Size of the chunk read from the shell channel at once
+READ_SIZE = 4096
+# Seconds exec channel waits for the client to close it
+CLOSE_TIMEOUT = 1.0
+
+
+def device_address(index):
+	"""Return loopback address of the device with given index"""
+	return '{}{}.{}'.format(ADDRESS_PREFIX, index // 250, 1 + index % 250)
+
+
+class DeviceServer(paramiko.ServerInterface):
+	"""paramiko server side of a single SSH connection to the device"""
+
+	def __init__(self, device):
+		self.device = device
+		self.username = None
+
+	def get_allowed_auths(self, username):
+		return 'password'
+
+	def check_auth_password(self, username, password):
+		self.username = username
+		return paramiko.AUTH_SUCCESSFUL
+
+	def check_channel_request(self, kind, chanid):
+		if kind == 'session':
+			return paramiko.OPEN_SUCCEEDED
+		return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+	def check_channel_pty_request(self, channel, term, width, height, pixelwidth, pixelheight, modes):
+		return True
+
+	def check_channel_shell_request(self, channel):
+		threading.Thread(target=run_shell, args=(channel, self.device, self.username), daemon=True).start()
+		return True
+
+	def check_channel_exec_request(self, channel, command):
+		threading.Thread(target=run_exec, args=(channel, self.device, self.username, command.decode('utf-8')),
+			daemon=True).start()
+		return True
+
+
+class DeviceFile(paramiko.SFTPHandle):
+	"""Read only handle of the file in device's memory"""
+
+	def __init__(self, data, flags=0):
+		super().__init__(flags)
+		self.readfile = io.BytesIO(data)
+		self.size = len(data)
+
+	def stat(self):
+		return file_attributes(self.size)
+
+
+class DeviceSFTP(paramiko.SFTPServerInterface):
+	"""SFTP subsystem serving files of the device - download and removal only"""
+
+	def __init__(self, server, *args, **kwargs):
+		super().__init__(server, *args, **kwargs)
+		self.device = server.device
+
+	def open(self, path, flags, attr):
+		if flags & (os.O_WRONLY | os.O_RDWR):
+			return paramiko.SFTP_PERMISSION_DENIED
+		data = self.device.get_file(normalize_path(path))
+		if data is None:
+			return paramiko.SFTP_NO_SUCH_FILE
+		self.device.wait()
+		return DeviceFile(data, flags)
+
+	def stat(self, path):
+		data = self.device.get_file(normalize_path(path))
+		if data is None:
+			return paramiko.SFTP_NO_SUCH_FILE
+		return file_attributes(len(data))
+
+	lstat = stat
+
+	def remove(self, path):
+		self.device.remove_file(normalize_path(path))
+		return paramiko.SFTP_OK
+
+
+def file_attributes(size):
+	"""Return SFTP attributes of regular file with given size"""
+	attributes = paramiko.SFTPAttributes()
+	attributes.st_size = size
+	attributes.st_mode = stat.S_IFREG | 0o644
+	return attributes
+
+def run_shell(channel, device, username):
+	"""
+	Function that drives interactive shell of the device - echoes every command,
+	sends its output followed by the prompt of the current mode
+
+	Args:
+		channel:	paramiko Channel with shell requested
+		device:		simulated Device
+		username:	user logged in to the device
+
+	Returns:
+		None
+	"""
+	session = Session(username)
+	try:
+		channel.sendall(('Welcome to {}\r\n'.format(device.hostname) + device.prompt(session)).encode('utf-8'))
+		buffer = b''
+		skip_newline = False
+		while True:
+			data = channel.recv(READ_SIZE)
+			if not data:
+				break
+			# Commands end with '\r' or '\n', '\r\n' counts as single end of line
+			if skip_newline and data.startswith(b'\n'):
+				data = data[1:]
+			skip_newline = data.endswith(b'\r')
+			buffer += data.replace(b'\r\n', b'\r').replace(b'\n', b'\r')
+			*lines, buffer = buffer.split(b'\r')
+			for line in lines:
+				command = line.decode('utf-8', 'replace').strip()
+				device.wait()
+				output = device.handle(session, command)
+				reply = command + '\n' + (output + '\n' if output else '') + device.prompt(session)
+				channel.sendall(reply.replace('\n', '\r\n').encode('utf-8'))
+	except (EOFError, OSError):
+		pass
+	finally:
+		channel.close()
+
+def run_exec(channel, device, username, command):
+	"""
+	Function that runs single command over exec channel and reports its exit status.
+	Output ends with EOF, the channel is closed by the client or after CLOSE_TIMEOUT -
+	closing it at once could overtake the reply to the exec request
+	"""
+	try:
+		device.wait()
+		output, status = device.execute(command, username)
+		channel.sendall(output)
+		channel.send_exit_status(status)
+		channel.shutdown_write()
+		channel.settimeout(CLOSE_TIMEOUT)
+		channel.recv(1)
+	except (EOFError, OSError):
+		pass
+	finally:
+		channel.close()
+
+
+class Simulator:
+	"""
+	Set of simulated devices listening on their loopback addresses.
+	Connections are accepted by single thread, every connection gets
+	paramiko Transport with its own thread as on a real SSH server
+	"""
+
+	def __init__(self, devices, port=DEFAULT_PORT):
+		# Address: Device
+		self.devices = {device_address(index): device for index, device in enumerate(devices)}
+		self.port = port
+		self.host_key = paramiko.RSAKey.generate(2048)
+		self.selector = selectors.DefaultSelector()
+		self.stopped = threading.Event()
+		self.thread = None
+		self.transports = []
+
+	def hosts(self):
+		"""Return dictionary of HOSTNAME:IP_ADDR of simulated devices"""
+		return {device.hostname: address for address, device in self.devices.items()}
+
+	def start(self):
+		"""Open listening sockets and start accepting connections"""
+		for address, device in self.devices.items():
+			listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+			listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+			listener.bind((address, self.port))
+			listener.listen(64)
+			listener.setblocking(False)
+			self.selector.register(listener, selectors.EVENT_READ, device)
+		self.thread = threading.Thread(target=self.accept, daemon=True)
+		self.thread.start()
+		return self
+
+	def accept(self):
+		"""Accept connections on all listening sockets until stopped"""
+		while not self.stopped.is_set():
+			for key, _ in self.selector.select(timeout=0.2):
+				try:
+					client, _ = key.fileobj.accept()
+				except BlockingIOError:
+					continue
+				client.setblocking(True)
+				transport = paramiko.Transport(client)
+				transport.add_server_key(self.host_key)
+				transport.set_subsystem_handler('sftp', paramiko.SFTPServer, DeviceSFTP)
+				# Negotiation runs in transport's thread - client leaving before handshake
+				# (e.g. reachability probe) does not block accepting other connections
+				transport.start_server(threading.Event(), server=DeviceServer(key.data))
+				self.transports.append(transport)
+
+	def stop(self):
+		"""Stop accepting connections and close all open ones"""
+		self.stopped.set()
+		if self.thread is not None:
+			self.thread.join()
+		for key in list(self.selector.get_map().values()):
+			self.selector.unregister(key.fileobj)
+			key.fileobj.close()
+		for transport in self.transports:
+			transport.close()
+
+	def __enter__(self):
+		return self.start()
+
+	def __exit__(self, *exc):
+		self.stop()
+
+
+def build_devices(vendor, count, latency=0.0, config_size=64 * 1024, license_days=365, **kwargs):
+	"""
+	Function that creates simulated devices of single vendor
+
+	Args:
+		vendor:			key of DEVICES (e.g. 'staros', 'bind')
+		count:			number of devices
+		latency:		seconds the device waits before answering each command
+		config_size:	size of generated configuration in bytes
+		license_days:	days till the license of the devices expires
+		kwargs:			additional vendor specific arguments (e.g. zones for 'bind')
+
+	Returns:
+		list of Device with hostnames bench-<vendor>-<index>
+	"""
+	device_class = DEVICES[vendor]
+	return [device_class('bench-{}-{:04d}'.format(vendor, index), latency, config_size, license_days, **kwargs)
+		for index in range(count)]
+
+
+# paramiko logs every closed connection as error - keep benchmark output readable
+logging.getLogger('paramiko').setLevel(logging.CRITICAL)
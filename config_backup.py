@@ -1,43 +1,113 @@
 #!/usr/bin/env python3
 from functions.git import *
+from functions.hash_index import refresh_index, save_index
+from functions.changeset import changes_by_host, commit_changes, stage_changes, shard_report
 from functions.common import *
+from functions.metrics import write_report, slowest
+from functions.registry import NODE_TYPES, load_node_type, capabilities
+from functions.license import load_license_cache, save_license_cache
+from functions.retry import save_breaker
+from functions.probe import probe_hosts
+from functions.inventory import load_inventory, select_nodes, shard_nodes, hosts_by_type
+from functions.ssh_pool import SSH_POOL
 from functions.variables import *
 
 """
 Script to gather configuraiton from nodes and upload them to git repository.
 Script is ready to use inside Kubernetes cluster with custom docker image.
+With SHARD_COUNT > 1 every pod backs up its slice of the inventory and stages
+changed files in STAGE_PATH, merge_backup.py commits them all at once.
 """
 
 # Set Git global settings inside container
 git_set_global_settings()
 
+# Nodes of the inventory processed by this shard
+nodes = select_nodes(load_inventory(INVENTORY_PATH), sites=INVENTORY_SITES, tags=INVENTORY_TAGS)
+nodes = shard_nodes(nodes, SHARD_INDEX, SHARD_COUNT)
+if SHARD_COUNT > 1:
+	print('---- Shard {} of {}: {} nodes'.format(SHARD_INDEX, SHARD_COUNT, len(nodes)))
+
+# Clone git repository if not present yet, limited to hosts of the shard
+print('---- Preparing git repo')
+git_bootstrap(GIT_REMOTE_URL, [node.hostname for node in nodes])
+
 # Pull current config files stored in git repository
 print('---- Pulling git repo')
 git_pull()
+# Update hash index of config files with changes pulled from git repository
+refresh_index()
+
+# Probe SSH port of all nodes of the shard at once, unreachable nodes are not logged in
+if PROBE_ENABLED:
+	probes = probe_hosts({node.hostname: node.ip for node in nodes}, SSH_POOL.port)
+	print('---- Probed {} nodes: {} reachable'.format(len(probes), sum(result.reachable for result in probes.values())))
+
+# Licenses gathered together with configs are shared with license_alert.py
+license_cache = load_license_cache() if COLLECT_LICENSE else None
+
+### Backup configuration of nodes of the shard - node types without hosts are not even loaded
+for node_name, hosts in hosts_by_type(nodes):
+	print('---- Config backup of {} nodes'.format(NODE_TYPES[node_name].description))
+	node_type = load_node_type(node_name)
+	if node_name == 'dns':
+		dns_backup(node_type, hosts, USERNAME, PASSWORD, WORKERS, RUN_DEADLINE, HOST_DEADLINE)
+	elif COLLECT_LICENSE and ARTIFACT_LICENSE in capabilities(node_type).artifacts:
+		# Config and license are gathered within single login to the node
+		collect_artifacts(node_type, hosts, USERNAME, PASSWORD, [ARTIFACT_CONFIG, ARTIFACT_LICENSE],
+			WORKERS, RUN_DEADLINE, HOST_DEADLINE, license_cache)
+	else:
+		config_backup(node_type, hosts, USERNAME, PASSWORD, WORKERS, RUN_DEADLINE, HOST_DEADLINE)
+
+if license_cache is not None:
+	save_license_cache(license_cache)
+
+# Keep hash index of config files for the next run
+save_index()
+# Keep failing hosts for the next run
+save_breaker()
+
+# Commit, tag and push only if any file changed during this run
+changes = changes_by_host()
+print('---- Changed files: {} on {} hosts'.format(sum(len(paths) for paths in changes.values()), len(changes)))
+for hostname, paths in changes.items():
+	print(INDENT + '{}: {} files'.format(hostname, len(paths)))
+
+if SHARD_COUNT > 1:
+	# Shards stage changed files, merge_backup.py commits, tags & pushes them
+	print('---- Staging changes in ' + STAGE_PATH)
+	print(INDENT + '{} files staged'.format(stage_changes(STAGE_PATH, SHARD_INDEX, SHARD_COUNT)))
+else:
+	print('---- Commiting changes')
+	if commit_changes(DATE, PER_HOST_COMMITS):
+		# Set tag for the commit
+		print('---- Setting daily tag')
+		daily_tag()
+
+		# Push changes to git repository
+		print('---- Pushing changes to git repo')
+		git_push('--follow-tags')
+	else:
+		print(INDENT + 'No configuration changes - skipping commit, tag and push')
+
+	# Pack refs and objects of the repository if maintenance is due
+	stats = git_maintenance()
+	if stats is not None:
+		print('---- Repository maintenance: {count} loose objects, {packs} packs, {size-pack} KiB packed, {refs} refs'.format(**stats))
+
+# Report of the run with duration of every host and phase
+if SHARD_COUNT > 1:
+	# Reports of all shards are kept next to staged files, textfile is left to merge step
+	report = write_report(shard_report(STAGE_PATH, SHARD_INDEX), None)
+else:
+	report = write_report(METRICS_JSON_PATH, METRICS_PROM_PATH)
+slowest_hosts, slowest_phases = slowest(report, METRICS_TOP)
+print('---- Run finished in {:.1f} s, the slowest hosts:'.format(report['duration']))
+for hostname, duration in slowest_hosts:
+	print(INDENT + '{}: {:.1f} s'.format(hostname, duration))
+print('---- The slowest phases:')
+for hostname, name, seconds in slowest_phases:
+	print(INDENT + '{} {}: {:.1f} s'.format(hostname, name, seconds))
 
-### Backup configuration of nodes provided below
-# Cisco vEPC instances
-print('---- Config backup of Cisco vEPC nodes')
-config_backup(vepc, vepcs, USERNAME, PASSWORD)
-# Cisco switches
-print('---- Config backup of Cisco switches')
-config_backup(switch, switches, USERNAME, PASSWORD)
-# Bind DNS nodes
-print('---- Config backup of Bind DNS nodes')
-dns_backup(dns, dns, USERNAME, PASSWORD)
-
-# Add all files to current commit
-print('---- Adding files to current commit')
-git_add()
-
-# Commit changes to repository
-print('---- Commiting changes')
-git_commit()
-
-# Set tag for the commit
-print('---- Setting daily tag')
-daily_tag()
-
-# Push changes to git repository
-print('---- Pushing changes to git repo')
-git_push('--follow-tags')
\ No newline at end of file
+# Close SSH connections kept by connection pool
+SSH_POOL.close_all()
\ No newline at end of file
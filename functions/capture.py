@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+import re
+import codecs
+
+from paramiko_expect import strip_ansi_codes
+
+from functions.expect import PromptMatcher, TAIL_WINDOW
+
+# Size of the chunk read from the channel at once
+READ_SIZE = 65536
+
+
+def capture_to_file(interact, command, prompt, file_path, timeout=60):
+	"""
+	Function that sends command and writes its output to file while it is received
+	until the prompt is found. Only the unfinished last line is kept in memory,
+	so memory used by the session does not depend on the output size.
+	Every chunk is cleaned once and the prompt is matched against the tail
+	of the last line only, so CPU time grows linearly.
+	Written output is the same as SSHClientInteraction current_output_clean -
+	command echo and new line before the prompt are kept, the prompt line is removed.
+	Only the tail of the prompt line is removed if the line is longer than READ_SIZE
+
+	Args:
+		interact:	SSHClientInteraction with the node's prompt already consumed
+		command:	command to send (e.g. 'show running-config')
+		prompt:		regex of the prompt ending the output (e.g. '.*{hostname}#.*')
+		file_path:	path to the file where output is written
+		timeout:	time limit in seconds for receiving next chunk of output
+
+	Returns:
+		number of characters written to the file
+	"""
+	matcher = PromptMatcher(prompt)
+	# Decoding errors are ignored like in SSHClientInteraction.expect()
+	decoder = codecs.getincrementaldecoder('utf-8')('ignore')
+	prompt_end = re.compile(prompt + '$')
+	channel = interact.channel
+	channel.settimeout(timeout)
+	interact.send(command)
+
+	written = 0
+	pending = '' # Unfinished last line
+	with open(file_path, 'w') as f:
+		while True:
+			data = channel.recv(READ_SIZE)
+			if not data:
+				raise ConnectionError('Connection closed while waiting for ' + prompt)
+			# Chunk is cleaned the same way as SSHClientInteraction.expect() cleans it
+			text = strip_ansi_codes(decoder.decode(data).replace('\r', ''))
+			matcher.feed(text)
+			newline = text.rfind('\n')
+			# Complete lines of the chunk are written at once
+			if newline >= 0:
+				lines = pending + text[:newline + 1]
+				f.write(lines)
+				written += len(lines)
+				pending = text[newline + 1:]
+			else:
+				pending += text
+			# Very long line without new line character is flushed except its tail
+			if len(pending) > READ_SIZE:
+				f.write(pending[:-TAIL_WINDOW])
+				written += len(pending) - TAIL_WINDOW
+				pending = pending[-TAIL_WINDOW:]
+			# Prompt is always the last unfinished line of the output
+			if matcher.match() is not None:
+				rest = prompt_end.sub('', pending)
+				f.write(rest)
+				written += len(rest)
+				interact.current_send_string = ''
+				interact.last_match = prompt
+				return written
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+import os
+import json
+import shutil
+import threading
+
+from functions.git import GIT_PATH, git_commit_paths, git_output
+from functions.variables import DATE
+
+# Paths relative to git repo changed during the run
+_changed = set()
+# Hosts whose job passed its deadline - changes made by their still running jobs are not recorded
+_expired = set()
+# Lock protecting changed paths recorded by concurrent backup jobs
+_lock = threading.Lock()
+
+
+def record_change(file_path):
+	"""
+	Function that records file in git repo created, modified or removed by the run.
+	Files of hosts which passed their deadline are not recorded, so late jobs
+	never add files to commit of the run
+
+	Args:
+		file_path:	path to the file
+
+	Returns:
+		None
+	"""
+	path = os.path.relpath(file_path, GIT_PATH)
+	if not path.startswith('..'):
+		with _lock:
+			if path.split(os.sep)[0] not in _expired:
+				_changed.add(path)
+
+def expire_host(hostname):
+	"""Stop recording changes of the host whose job passed its deadline"""
+	with _lock:
+		_expired.add(hostname)
+
+def host_expired(hostname):
+	"""Return True if the host's job passed its deadline"""
+	with _lock:
+		return hostname in _expired
+
+def changed_paths():
+	"""Return sorted list of paths relative to git repo changed during the run"""
+	with _lock:
+		return sorted(_changed)
+
+def clear_changes():
+	"""Forget recorded changes e.g. after they are commited"""
+	with _lock:
+		_changed.clear()
+
+def changes_by_host():
+	"""
+	Function that groups recorded changes by host folder in git repo
+
+	Returns:
+		dictionary of HOSTNAME:list of changed paths
+	"""
+	hosts = {}
+	for path in changed_paths():
+		hosts.setdefault(path.split('/')[0], []).append(path)
+	return hosts
+
+def commit_changes(message=DATE, per_host=False):
+	"""
+	Function that commits files changed during the run. Nothing is commited
+	if no file changed. In per host mode every host gets its own commit,
+	so history of a single node can be queried cheaply
+
+	Args:
+		message:	commit message (default DATE)
+		per_host:	commit changes of each host separately (default False)
+
+	Returns:
+		list of new commit ids, empty if there was nothing to commit
+	"""
+	if per_host:
+		groups = [(hostname + ': ' + message, paths) for hostname, paths in changes_by_host().items()]
+	else:
+		groups = [(message, changed_paths())]
+	commits = []
+	for group_message, paths in groups:
+		if paths:
+			commit = git_commit_paths(paths, group_message)
+			if commit is not None:
+				commits.append(commit)
+	clear_changes()
+	return commits
+
+def shard_stage(stage_path, shard):
+	"""Return folder with files staged by the shard"""
+	return '{}shard-{}/'.format(stage_path, shard)
+
+def shard_manifest(stage_path, shard):
+	"""Return manifest of files staged by the shard"""
+	return '{}shard-{}.json'.format(stage_path, shard)
+
+def shard_report(stage_path, shard):
+	"""Return run report of the shard kept next to its staged files"""
+	return '{}shard-{}-report.json'.format(stage_path, shard)
+
+def stage_changes(stage_path, shard, count):
+	"""
+	Function that copies files changed by the shard to the stage folder shared with
+	merge step instead of commiting them. Manifest is written last, so merge step
+	never takes half staged shard
+
+	Args:
+		stage_path:	folder shared by all shards and merge step
+		shard:		index of this shard
+		count:		number of shards
+
+	Returns:
+		number of staged paths
+	"""
+	shard_path = shard_stage(stage_path, shard)
+	manifest_path = shard_manifest(stage_path, shard)
+	# Files staged by previous run of the shard are replaced
+	if os.path.exists(manifest_path):
+		os.remove(manifest_path)
+	shutil.rmtree(shard_path, ignore_errors=True)
+	changed = []
+	removed = []
+	for path in changed_paths():
+		if os.path.isfile(GIT_PATH + path):
+			os.makedirs(os.path.dirname(shard_path + path), exist_ok=True)
+			shutil.copy2(GIT_PATH + path, shard_path + path)
+			changed.append(path)
+		else:
+			removed.append(path)
+	manifest = {'shard': shard, 'count': count, 'date': DATE, 'changed': changed, 'removed': removed}
+	os.makedirs(stage_path, exist_ok=True)
+	tmp_file = manifest_path + '.tmp'
+	with open(tmp_file, 'w') as f:
+		json.dump(manifest, f)
+	os.replace(tmp_file, manifest_path)
+	restore_paths(changed + removed)
+	clear_changes()
+	return len(changed) + len(removed)
+
+def restore_paths(paths):
+	"""
+	Function that returns staged paths of the shard's clone to their state in HEAD,
+	so the next pull of the shard is not blocked by its own uncommited changes.
+	Paths not present in HEAD are removed
+
+	Args:
+		paths:	list of paths relative to git repository
+
+	Returns:
+		None
+	"""
+	if not paths:
+		return
+	# Single git process tells which paths exist in HEAD - missing ones were added by the run
+	objects = git_output('cat-file', '--batch-check=%(objecttype)',
+		stdin=''.join('HEAD:{}\n'.format(path) for path in paths).encode('utf-8')).split('\n')
+	tracked = [path for path, kind in zip(paths, objects) if kind == 'blob']
+	if tracked:
+		git_output('checkout', '-q', 'HEAD', '--pathspec-from-file=-', '--pathspec-file-nul',
+			stdin=''.join(path + '\0' for path in tracked).encode('utf-8'))
+	for path in set(paths) - set(tracked):
+		if os.path.isfile(GIT_PATH + path):
+			os.remove(GIT_PATH + path)
+
+def merge_staged(stage_path, count):
+	"""
+	Function that applies files staged by all shards to git repo and records
+	them as changes of this run, so they are commited by commit_changes()
+
+	Args:
+		stage_path:	folder shared by all shards and merge step
+		count:		number of shards
+
+	Returns:
+		list of merged shard indexes and list of shard indexes without manifest
+	"""
+	merged = []
+	missing = []
+	for shard in range(count):
+		shard_path = shard_stage(stage_path, shard)
+		try:
+			with open(shard_manifest(stage_path, shard), 'r') as f:
+				manifest = json.load(f)
+		except (OSError, ValueError):
+			missing.append(shard)
+			continue
+		if manifest['count'] != count:
+			# Hosts of the shard were split by different number of shards
+			missing.append(shard)
+			continue
+		for path in manifest['changed']:
+			os.makedirs(os.path.dirname(GIT_PATH + path), exist_ok=True)
+			shutil.copy2(shard_path + path, GIT_PATH + path)
+			record_change(GIT_PATH + path)
+		for path in manifest['removed']:
+			if os.path.exists(GIT_PATH + path):
+				os.remove(GIT_PATH + path)
+			record_change(GIT_PATH + path)
+		merged.append(shard)
+	return merged, missing
+
+def clear_staged(stage_path, shards):
+	"""Remove files, manifests and reports of merged shards from stage folder"""
+	for shard in shards:
+		for path in [shard_manifest(stage_path, shard), shard_report(stage_path, shard)]:
+			if os.path.exists(path):
+				os.remove(path)
+		shutil.rmtree(shard_stage(stage_path, shard), ignore_errors=True)
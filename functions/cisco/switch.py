@@ -1,11 +1,29 @@
 #!/usr/bin/env python3
-import paramiko
-import subprocess
 from paramiko_expect import SSHClientInteraction
 
+from functions.capture import capture_to_file
+from functions.changeset import record_change
+from functions.compare import compare_and_store
+from functions.expect import expect
 from functions.git import GIT_PATH
-from functions.variables import TMP_PATH, DATE, INDENT, COMPARE_CONFIG_IGNORE, COMPARE_CONFIG_REPLACE, COMPARE_CONFIG_ADD
+from functions.metrics import Stopwatch, timed
+from functions.retry import record_error
+from functions.ssh_pool import SSH_POOL
+from functions.variables import TMP_PATH, DATE
+from functions.variables import ARTIFACT_CONFIG, ARTIFACT_VERSION, ARTIFACT_INVENTORY
 
+# Lines with hashed passwords - differ every time config is generated
+IGNORE_RULES = ['+B']
+# Artifacts which can be gathered from the node
+ARTIFACTS = [ARTIFACT_CONFIG, ARTIFACT_VERSION, ARTIFACT_INVENTORY]
+# Config file name scheme
+CONFIG_FILE_SCHEME = '{hostname}.cfg'
+# Software version is part of the config file name
+VERSIONED_CONFIG = False
+# License of the node can be checked
+LICENSE_SUPPORT = False
+
+@timed('save_config')
 def save_config(hostname, ip, username, password):
 	"""
 	Function that downloads running-configuration from Cisco switch
@@ -18,36 +36,68 @@ def save_config(hostname, ip, username, password):
 	Returns:
 		name of the configuraiton file or log with connection error
 	"""
+	collected = collect(hostname, ip, username, password, [ARTIFACT_CONFIG])
+	return collected.get(ARTIFACT_CONFIG, '{}-errors.log'.format(hostname))
+
+def collect(hostname, ip, username, password, artifacts=ARTIFACTS):
+	"""
+	Function that gathers requested artifacts of Cisco switch
+	within single SSH session
+	Args:
+		hostname: 	switch hostname
+		ip:			switch management ip address
+		username:	user's login switch
+		password:	user's passowrd to switch
+		artifacts:	list of artifacts to gather (default all in ARTIFACTS)
+	
+	Returns:
+		dictionary of ARTIFACT:VALUE - configuration file name, version and
+		inventory output. Artifacts not gathered due to error are missing
+	"""
 
 	# Set PROMPT variables for Cisco routers/swtiches
 	USER_PROMPT = f'.*{hostname}>.*' # User mdoe
 	PRIVILEGED_PROMPT = f'.*{hostname}#.*' # Provileged (config) mode
 
+	collected = {}
+	ssh = interact = None
+	stopwatch = Stopwatch()
 	try:
-		ssh = paramiko.SSHClient()
-		ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-		ssh.connect(ip, username=username, password=password,
+		# Reuse pooled connection to the node if available
+		ssh = SSH_POOL.acquire(ip, username, password,
 			timeout=60,	look_for_keys=False, allow_agent=False)
+		stopwatch.lap('connect')
 		# Library to interact with with SSH output
 		interact = SSHClientInteraction(ssh, timeout=60, display=False)
 		# Wait for switch prompt user (.*>) or privileged (.*#)
-		interact.expect([USER_PROMPT, PRIVILEGED_PROMPT])
+		expect(interact, [USER_PROMPT, PRIVILEGED_PROMPT])
 		# If user mode enable privileged
 		if interact.last_match == USER_PROMPT:
 			interact.send('enable')
-			interact.expect('Password: ')
+			expect(interact, 'Password: ')
 			interact.send(password)
-			interact.expect(PRIVILEGED_PROMPT) # Wait for privilage mode
-		file_name = hostname + '.cfg'
+			expect(interact, PRIVILEGED_PROMPT) # Wait for privilage mode
 		# Set terminal length for session to infinite
 		# (no "-- More --" prompt)
 		interact.send('terminal length 0')
-		interact.expect(PRIVILEGED_PROMPT)
-		interact.send('show running-config')
-		interact.expect(PRIVILEGED_PROMPT)
-		config = interact.current_output_clean
-		with open(TMP_PATH + file_name, 'a') as f:
-			f.write(config)
+		expect(interact, PRIVILEGED_PROMPT)
+		stopwatch.lap('prompt')
+		if ARTIFACT_VERSION in artifacts:
+			interact.send('show version')
+			expect(interact, PRIVILEGED_PROMPT)
+			collected[ARTIFACT_VERSION] = interact.current_output_clean
+			stopwatch.lap('version')
+		if ARTIFACT_INVENTORY in artifacts:
+			interact.send('show inventory')
+			expect(interact, PRIVILEGED_PROMPT)
+			collected[ARTIFACT_INVENTORY] = interact.current_output_clean
+			stopwatch.lap('inventory')
+		if ARTIFACT_CONFIG in artifacts:
+			file_name = CONFIG_FILE_SCHEME.format(hostname=hostname)
+			# Config is written to file while received instead of being kept in memory
+			capture_to_file(interact, 'show running-config', PRIVILEGED_PROMPT, TMP_PATH + file_name)
+			collected[ARTIFACT_CONFIG] = file_name
+			stopwatch.lap('export')
 	
 	except Exception as e:
 		# Any exception is logged to file with current date
@@ -55,12 +105,19 @@ def save_config(hostname, ip, username, password):
 		log = DATE + ' : ' + str(e)
 		with open(GIT_PATH + hostname + '/' + file_name, 'a') as f:
 			f.write(log + '\n')
+		record_change(GIT_PATH + hostname + '/' + file_name)
+		record_error(hostname, e)
 	
 	finally:
-		ssh.close()
+		# Close only the interactive channel and return connection to the pool
+		if interact is not None:
+			interact.close()
+		if ssh is not None:
+			SSH_POOL.release(ssh)
 
-	return file_name
+	return collected
 
+@timed('compare')
 def compare_configs(hostname, config_name, old_config_name):
 	"""
 	Funciton that compare given config file with one stored in git repo.
@@ -72,24 +129,6 @@ def compare_configs(hostname, config_name, old_config_name):
 		old_config_name: config file name stored in git repo
 	
 	Returns:
-		None
+		CONFIG_SAME, CONFIG_CHANGED or CONFIG_ADDED
 	"""
-	new_config = TMP_PATH + config_name
-	old_config_path = GIT_PATH + hostname + '/'
-	# If config file names are the same (e.g. same SW version) then compare configs
-	if (config_name == old_config_name):
-		# Compare configs and ommits lines with hashed password - flag "-I +"
-		# Everytime a config file is genereated the hash differs which is not relevant for config changes
-		diff_results = subprocess.run(['diff', '-u', '-I', '+B', new_config, old_config_path + old_config_name], stdout=subprocess.PIPE)
-		if diff_results.returncode == 0:
-			# If configs are the same then remove downloaded config file
-			print(COMPARE_CONFIG_IGNORE)
-			subprocess.run(['rm', new_config], stdout=subprocess.PIPE)
-		else:
-			# If configs differs then move downloaded file to git repo
-			print(COMPARE_CONFIG_REPLACE)
-			subprocess.run(['mv', new_config, old_config_path], stdout=subprocess.PIPE)
-	# If config file names differs (e.g. different SW version) then move downloaded file to git repo
-	else:
-		print(COMPARE_CONFIG_ADD)
-		subprocess.run(['mv', new_config, old_config_path], stdout=subprocess.PIPE)
\ No newline at end of file
+	return compare_and_store(TMP_PATH + config_name, GIT_PATH + hostname + '/', old_config_name, IGNORE_RULES)
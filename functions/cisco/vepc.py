@@ -1,17 +1,39 @@
 #!/usr/bin/env python3
-import paramiko
-import subprocess
-import datetime
 from paramiko_expect import SSHClientInteraction
 
+from functions.changeset import record_change
+from functions.compare import compare_and_store
+from functions.expect import expect
 from functions.git import GIT_PATH
-from functions.variables import TMP_PATH, DATE, TODAY, INDENT, LICENSE_EXTENSION, COMPARE_CONFIG_IGNORE, COMPARE_CONFIG_REPLACE, COMPARE_CONFIG_ADD
+from functions.license import license_parser, earliest_expire_date
+from functions.metrics import Stopwatch, timed
+from functions.retry import record_error
+from functions.ssh_pool import SSH_POOL
+from functions.variables import TMP_PATH, DATE
+from functions.variables import ARTIFACT_CONFIG, ARTIFACT_VERSION, ARTIFACT_LICENSE, ARTIFACT_INVENTORY
+
+# Lines with hashed passwords - differ every time config is generated
+IGNORE_RULES = ['+B']
 
 # Path to SFTP folder on remote host
 SFTP_PATH = '/sftp/'
 # Command that shows license information
 SHOW_LICENSE_INFORMATION_CMD = 'show license information'
+# Line with 'Expire' - month, day & year are 3rd, 4th and 7th word of the line
+# 	separators are spaces & tabs only, so line with fewer words never takes words of the next line
+LICENSE_PARSER = license_parser(r'^(?=.*Expire)[ \t]*\S+[ \t]+\S+[ \t]+(?P<month>\S+)[ \t]+(?P<day>\S+)[ \t]+\S+[ \t]+\S+[ \t]+(?P<year>\S+)', '%d %B %Y')
+# Command that shows hardware inventory
+SHOW_INVENTORY_CMD = 'show hardware'
+# Artifacts which can be gathered from the node
+ARTIFACTS = [ARTIFACT_CONFIG, ARTIFACT_VERSION, ARTIFACT_LICENSE, ARTIFACT_INVENTORY]
+# Config file name scheme
+CONFIG_FILE_SCHEME = '{hostname}_{version}.cfg'
+# Software version is part of the config file name
+VERSIONED_CONFIG = True
+# License of the node can be checked
+LICENSE_SUPPORT = True
 
+@timed('save_config')
 def save_config(hostname, ip, username, password):
 	"""
 	Function that downloads current config of Cisco vEPC node
@@ -25,34 +47,74 @@ def save_config(hostname, ip, username, password):
 	Returns:
 		name of the configuraiton file or log with connection error
 	"""
+	collected = collect(hostname, ip, username, password, [ARTIFACT_CONFIG])
+	return collected.get(ARTIFACT_CONFIG, '{}-errors.log'.format(hostname))
+
+def collect(hostname, ip, username, password, artifacts=ARTIFACTS):
+	"""
+	Function that gathers requested artifacts of Cisco vEPC node
+	within single SSH session
+	
+	Args:
+		hostname: 	node's hostname
+		ip:			node's management ip address
+		username:	user's login to node
+		password:	user's passowrd to node
+		artifacts:	list of artifacts to gather (default all in ARTIFACTS)
+	
+	Returns:
+		dictionary of ARTIFACT:VALUE - configuration file name, software version,
+		license and inventory output. Artifacts not gathered due to error are missing
+	"""
 
 	PROMPT = '.*{}#.*'.format(hostname)
-	PROMPT_CFG = '.*{}\(config\)#.*'.format(hostname)
 
+	collected = {}
+	ssh = interact = None
+	stopwatch = Stopwatch()
 	try:
-		ssh = paramiko.SSHClient()
-		ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-		ssh.connect(ip, username=username, password=password, timeout=30)
+		# Reuse pooled connection to the node if available
+		ssh = SSH_POOL.acquire(ip, username, password, timeout=30)
+		stopwatch.lap('connect')
 		interact = SSHClientInteraction(ssh, timeout=60, display=False)
-		interact.expect(PROMPT)
+		expect(interact, PROMPT)
+		stopwatch.lap('prompt')
 		# Check node software version
 		interact.send('show version')
-		interact.expect(PROMPT)
+		expect(interact, PROMPT)
+		stopwatch.lap('version')
 		version = interact.current_output_clean.split('\n')
 		# Put node version into file name
 		for line in version:
 			if ('Image Version:') in line:
-				file_name = '{}_{}.cfg'.format(hostname, line.split()[2])
-		# Save node config in path /sftp/<file_name>
-		interact.send('save configuration {}{}'.format(SFTP_PATH, file_name))
-		interact.expect(PROMPT)
-		# Open SFTP conneciton to download config file
-		sftp = ssh.open_sftp()
-		sftp.get(SFTP_PATH + file_name, TMP_PATH + file_name)
-		sftp.close()
-		# Delete config file to free up space
-		interact.send('delete {}{}'.format(SFTP_PATH, file_name))
-		interact.expect(PROMPT)
+				file_name = CONFIG_FILE_SCHEME.format(hostname=hostname, version=line.split()[2])
+				if ARTIFACT_VERSION in artifacts:
+					collected[ARTIFACT_VERSION] = line.split()[2]
+		if ARTIFACT_LICENSE in artifacts:
+			interact.send(SHOW_LICENSE_INFORMATION_CMD)
+			expect(interact, PROMPT)
+			collected[ARTIFACT_LICENSE] = interact.current_output_clean
+			stopwatch.lap('license')
+		if ARTIFACT_INVENTORY in artifacts:
+			interact.send(SHOW_INVENTORY_CMD)
+			expect(interact, PROMPT)
+			collected[ARTIFACT_INVENTORY] = interact.current_output_clean
+			stopwatch.lap('inventory')
+		if ARTIFACT_CONFIG in artifacts:
+			# Save node config in path /sftp/<file_name>
+			interact.send('save configuration {}{}'.format(SFTP_PATH, file_name))
+			expect(interact, PROMPT)
+			stopwatch.lap('export')
+			# Open SFTP conneciton to download config file
+			sftp = ssh.open_sftp()
+			sftp.get(SFTP_PATH + file_name, TMP_PATH + file_name)
+			sftp.close()
+			stopwatch.lap('download')
+			# Delete config file to free up space
+			interact.send('delete {}{}'.format(SFTP_PATH, file_name))
+			expect(interact, PROMPT)
+			stopwatch.lap('cleanup')
+			collected[ARTIFACT_CONFIG] = file_name
 	
 	except Exception as e:
 		# Any exception is logged to file with current date
@@ -60,12 +122,19 @@ def save_config(hostname, ip, username, password):
 		log = DATE + ' : ' + str(e)
 		with open(GIT_PATH + hostname + '/' + file_name, 'a') as f:
 			f.write(log + '\n')
+		record_change(GIT_PATH + hostname + '/' + file_name)
+		record_error(hostname, e)
 	
 	finally:
-		ssh.close()
+		# Close only the interactive channel and return connection to the pool
+		if interact is not None:
+			interact.close()
+		if ssh is not None:
+			SSH_POOL.release(ssh)
 
-	return file_name
+	return collected
 
+@timed('compare')
 def compare_configs(hostname, config_name, old_config_name):
 	"""
 	Funciton that compare given config file with one stored in git repo.
@@ -77,55 +146,18 @@ def compare_configs(hostname, config_name, old_config_name):
 		old_config_name: config file name stored in git repo
 	
 	Return:
-		None
+		CONFIG_SAME, CONFIG_CHANGED or CONFIG_ADDED
 	"""
-	new_config = TMP_PATH + config_name
-	old_config_path = GIT_PATH + hostname + '/'
-	# If config file names are the same (e.g. same SW version) then compare configs
-	if (config_name == old_config_name):
-		# Compare configs and ommits lines with hashed password - flag "-I +B"
-		# Everytime a config file is genereated the hash differs which is not relevant for config changes
-		diff_results = subprocess.run(['diff', '-u', '-I', '+B', new_config, old_config_path + old_config_name], stdout=subprocess.PIPE)
-		if diff_results.returncode == 0:
-			# If configs are the same then remove downloaded config file
-			print(COMPARE_CONFIG_IGNORE)
-			subprocess.run(['rm', new_config], stdout=subprocess.PIPE)
-		else:
-			# If configs differs then move downloaded file to git repo
-			print(COMPARE_CONFIG_REPLACE)
-			subprocess.run(['mv', new_config, old_config_path], stdout=subprocess.PIPE)
-	# If config file names differs (e.g. different SW version) then move downloaded file to git repo
-	else:
-		print(COMPARE_CONFIG_ADD)
-		subprocess.run(['mv', new_config, old_config_path], stdout=subprocess.PIPE)
+	return compare_and_store(TMP_PATH + config_name, GIT_PATH + hostname + '/', old_config_name, IGNORE_RULES)
 
-def validate_license(hostname, license):
+def license_expire_date(license):
 	"""
-	Function that checks license expire date and add returns license file
-	if expire date is less than 30 days that will be attached notification
-	mail to the user. It also add table to HTML body of the expired node for
-	later email message to user
+	Function that finds the earliest license expire date in license output
 
 	Args:
-		hostname:	node's hostname
 		license:	node's license output in utf-8 format
 
 	Returns:
-		name of the license file
+		expire date or None if no expire date found
 	"""
-	for line in license.splitlines():
-		if 'Expire' in line:
-			expire = line.split()
-			expire_string = expire[3] + expire[2] + expire[6]
-			expire_date = datetime.datetime.strptime(expire_string, '%d%B%Y').date()
-			if expire_date - TODAY <= datetime.timedelta(days=30):
-				license_name = hostname + LICENSE_EXTENSION
-				# Save current node license to file
-				with open(TMP_PATH + license_name, 'w+') as f:
-					f.write(license)
-				# Add node license info to HTML formatted table which will be attached to mail
-				with open(TMP_PATH + 'body_table.txt', 'a+') as f:
-					text = '<tr><td>{}</td><td>{}</td><td>{}</td></tr>'.format(hostname, expire_date, expire_date - TODAY)
-					f.write(text)
-
-				return license_name
\ No newline at end of file
+	return earliest_expire_date(license, LICENSE_PARSER)
\ No newline at end of file
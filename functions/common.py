@@ -1,17 +1,38 @@
 #!/usr/bin/env python3
 import os
 import glob
-import paramiko
+import time
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
-import functions.cisco.switch as switch
-import functions.cisco.vepc as vepc
-import functions.ericsson.mk as mk
-import functions.dns as dns
 from functions.git import GIT_PATH
-from functions.variables import TMP_PATH, INDENT
+from functions.changeset import expire_host, host_expired
+from functions.ssh_pool import SSH_POOL
+from functions.hash_index import host_files
+from functions.metrics import host_context, record_host
+from functions.registry import capabilities, config_version
+from functions.retry import call_with_retry, retry_deadline, take_error, breaker_hosts, record_outcome
+from functions.probe import unreachable_hosts
+from functions.license import LicenseRecord, needs_refresh, cached_record, update_license_cache, save_expiring_license
+from functions.variables import TMP_PATH, TODAY, INDENT, ARTIFACT_CONFIG, ARTIFACT_LICENSE, RUN_DEADLINE, HOST_DEADLINE, PROBE_ENABLED
 
+# Result of the job executed on a single host
+# 	hostname:	node's hostname
+# 	status:		'ok', 'error', 'timeout', 'unreachable' (SSH port probe failed)
+# 				or 'skipped' (failing for several runs)
+# 	output:		value returned by the job (e.g. downloaded file name)
+# 	error:		error message if the job failed otherwise None
+# 	duration:	job execution time in seconds
+HostResult = namedtuple('HostResult', ['hostname', 'status', 'output', 'error', 'duration'])
 
-def get_latest_config(hostname, version=None):
+# Lock serializing compare/move of downloaded files into git repository
+GIT_LOCK = threading.Lock()
+# Seconds between deadline checks while some hosts wait for a free worker
+DEADLINE_POLL = 0.2
+
+
+def get_latest_config(hostname, version=None, config_file=None):
 	"""
 	Function to find the newest configuration file for the
 	given hostname in git repository
@@ -19,14 +40,16 @@ def get_latest_config(hostname, version=None):
 	Args:
 		hostname: hostname
 		version: file version
+		config_file: config file name scheme of the node type (e.g. '{hostname}_{version}.cfg')
 
 	Returns:
 		newest configuration file if available otherwise None
 	"""
-	if version is None:
-		config_list = get_files_list(GIT_PATH + hostname, f'{hostname}.cfg')
-	else:
-		config_list = get_files_list(GIT_PATH + hostname, f'{hostname}_{version}.cfg')
+	if config_file is None:
+		config_file = '{hostname}.cfg' if version is None else '{hostname}_{version}.cfg'
+	pattern = config_file.format(hostname=hostname, version='*' if version is None else version)
+	# Files known from hash index are listed without scanning the host folder
+	config_list = host_files(hostname, pattern) or get_files_list(GIT_PATH + hostname, pattern)
 	if len(config_list) < 1:
 		return None
 	else:
@@ -46,143 +69,401 @@ def get_files_list(files_path, pattern='*'):
 	Returns:
 		list of files in path which matches pattern
 	"""
-	os.chdir(files_path)
-	return glob.glob(pattern)
+	# Working directory is shared by all threads so it is not changed here
+	return [os.path.basename(f) for f in glob.glob(os.path.join(files_path, pattern))]
+
+def run_on_hosts(job, hosts, workers=1, deadline=RUN_DEADLINE, host_deadline=HOST_DEADLINE, breaker=False, probe=False):
+	"""
+	Function that executes job for every given host using bounded pool of workers.
+	Hosts exceeding their deadline are reported as timed out and are not waited for,
+	their still running jobs can not store files to git repository anymore
+
+	Args:
+		job:			function called as job(hostname, ip) for each host
+		hosts: 			dictionary of the nodes containing HOSTNAME:IP_ADDR
+		workers:		number of hosts processed at the same time (default 1)
+		deadline:		time limit in seconds for all hosts (default RUN_DEADLINE)
+		host_deadline:	time limit in seconds for a single host (default HOST_DEADLINE)
+		breaker:		skip hosts failing for several runs and run failing hosts last,
+						results are recorded to circuit breaker (default False)
+		probe:			run job only on hosts with reachable SSH port (default False)
+
+	Returns:
+		list of HostResult in the same order as given hosts
+	"""
+	started = {}
+	results = {}
+	all_hosts = hosts
+
+	if breaker:
+		hosts, skipped = breaker_hosts(hosts)
+		for hostname, open_until in skipped.items():
+			error = 'Failing for several runs - skipped until ' + time.ctime(open_until)
+			results[hostname] = HostResult(hostname, 'skipped', None, error, 0.0)
+			print(INDENT + 'ERROR Host {} {}'.format(hostname, error))
 
-def config_backup(node_type, hosts, username, password):
+	if probe:
+		# Hosts probed earlier in the run (e.g. whole inventory at start) are not probed again
+		unreachable = unreachable_hosts(hosts, SSH_POOL.port)
+		for hostname, result in unreachable.items():
+			results[hostname] = HostResult(hostname, 'unreachable', None, result.error, result.seconds)
+			print(INDENT + 'ERROR Host {} unreachable: {}'.format(hostname, result.error))
+		hosts = {hostname: ip for hostname, ip in hosts.items() if hostname not in unreachable}
+
+	def run(hostname, ip):
+		started[hostname] = time.monotonic()
+		# Retries are not started if they would not finish before the host's deadline
+		limit = started[hostname] + host_deadline if host_deadline is not None else None
+		# Phases measured during the job are reported for the host
+		with host_context(hostname), retry_deadline(limit):
+			return job(hostname, ip)
+
+	executor = ThreadPoolExecutor(max_workers=max(1, workers))
+	run_start = time.monotonic()
+	futures = {executor.submit(run, hostname, ip): hostname for hostname, ip in hosts.items()}
+	pending = set(futures)
+	while pending:
+		# Wake up when next host finishes or when the closest deadline passes
+		now = time.monotonic()
+		limits = []
+		if deadline is not None:
+			limits.append(run_start + deadline - now)
+		if host_deadline is not None:
+			running = [futures[f] for f in pending if futures[f] in started]
+			limits.extend(started[hostname] + host_deadline - now for hostname in running)
+			# Host starting while waiting would not be limited - its start is polled
+			if len(running) < len(pending):
+				limits.append(DEADLINE_POLL)
+		timeout = max(0, min(limits)) if limits else None
+		done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+
+		for future in done:
+			hostname = futures[future]
+			duration = time.monotonic() - started.get(hostname, run_start)
+			try:
+				results[hostname] = HostResult(hostname, 'ok', future.result(), None, duration)
+			except Exception as e:
+				results[hostname] = HostResult(hostname, 'error', None, str(e), duration)
+
+		now = time.monotonic()
+		for future in list(pending):
+			hostname = futures[future]
+			run_expired = deadline is not None and now - run_start >= deadline
+			host_late = (host_deadline is not None and hostname in started
+				and now - started[hostname] >= host_deadline)
+			if run_expired or host_late:
+				future.cancel()
+				pending.discard(future)
+				# Store already in progress finishes first, later ones are refused
+				with GIT_LOCK:
+					expire_host(hostname)
+				duration = now - started.get(hostname, now)
+				results[hostname] = HostResult(hostname, 'timeout', None, 'Deadline exceeded', duration)
+				print(INDENT + 'ERROR Deadline exceeded for host ' + hostname)
+
+	# Do not block on hosts that are still running after deadline
+	executor.shutdown(wait=False, cancel_futures=True)
+	for result in results.values():
+		record_host(result)
+		if breaker and result.status != 'skipped':
+			record_outcome(result.hostname, result.status == 'ok', result.error)
+	return [results[hostname] for hostname in all_hosts]
+
+def config_backup(node_type, hosts, username, password, workers=1, deadline=RUN_DEADLINE, host_deadline=HOST_DEADLINE):
 	"""
 	Function that iterates through given hosts for configuration backup.
 	The downloaded config is compared with one stored in git repository 
 	and any files that differ are updated to repository
 
+	Args:
+		node_type:		distinguishing functions for different node types
+		hosts: 			dictionary of the nodes containing HOSTNAME:IP_ADDR
+		username:		user's login to host
+		password:		user's password to host
+		workers:		number of hosts backed up at the same time (default 1)
+		deadline:		time limit in seconds for all hosts (default RUN_DEADLINE)
+		host_deadline:	time limit in seconds for a single host (default HOST_DEADLINE)
+
+	Returns:
+		list of HostResult for given hosts
+	"""
+	def job(hostname, ip):
+		return host_config_backup(node_type, hostname, ip, username, password)
+
+	return run_on_hosts(job, hosts, workers, deadline, host_deadline, breaker=True, probe=PROBE_ENABLED)
+
+def host_config_backup(node_type, hostname, ip, username, password):
+	"""
+	Function that backs up configuration of a single host.
+	The downloaded config is compared with one stored in git repository 
+	and updated in repository if it differs
+
 	Args:
 		node_type:	distinguishing functions for different node types
-		hosts: 		dictionary of the nodes containing HOSTNAME:IP_ADDR
+		hostname:	node's hostname
+		ip:			node's management ip address
 		username:	user's login to host
 		password:	user's password to host
 
 	Returns:
-		None
+		name of the downloaded configuration file
 	"""
-	for hostname, ip in hosts.items():
-		print('Backup of host config: ' + hostname)
-		# Path where host's configuraiton files are stored from git repo 
-		path = GIT_PATH + hostname
-		# Creates host directory if not in repo yet
-		if not os.path.exists(path):
-			os.mkdir(path, 0o755) # Creates folder with appropriate permissions
-		new_config = node_type.save_config(hostname, ip, username, password)
-		while not new_config:
-			pass # Wait till configuration file is downloaded from the node
-		print(INDENT + 'Downloaded file: ' + new_config)
-		if (new_config != '{}-errors.log'.format(hostname)):
-			# Get the last config file from git repo
-			if node_type in [asr, mk]:
-				# If node is in asr or mk group
-				config_version = new_config.split('_')[1][:-4]
-				old_config = get_latest_config(hostname, config_version)
-			else:
-				old_config = get_latest_config(hostname)
+	print('Backup of host config: ' + hostname)
+	# Path where host's configuraiton files are stored from git repo 
+	path = GIT_PATH + hostname
+	# Creates host directory if not in repo yet
+	os.makedirs(path, 0o755, exist_ok=True) # Creates folder with appropriate permissions
+	# save_config returns only when download is finished or failed (retried after transient error),
+	# host exceeding its deadline is reported by run_on_hosts()
+	new_config = call_with_retry(hostname, node_type.save_config, hostname, ip, username, password)
+	if not new_config:
+		raise RuntimeError('No configuration file downloaded from {}'.format(hostname))
+	return store_config(node_type, hostname, new_config)
 
-			node_type.compare_configs(hostname, new_config, old_config)
+def store_config(node_type, hostname, new_config):
+	"""
+	Function that compares downloaded configuration with one stored in git
+	repository and updates it in repository if it differs
+
+	Args:
+		node_type:	distinguishing functions for different node types
+		hostname:	node's hostname
+		new_config:	name of the file returned by node's save_config
+
+	Returns:
+		name of the downloaded configuration file
+	"""
+	print(INDENT + 'Downloaded file: ' + new_config)
+	if (new_config != '{}-errors.log'.format(hostname)):
+		# Get the last config file from git repo
+		node = capabilities(node_type)
+		if node.versioned_config:
+			# Config of the same software version is compared
+			version = config_version(node.config_file, hostname, new_config)
+			old_config = get_latest_config(hostname, version, node.config_file)
 		else:
-			print(INDENT + 'ERROR Configuration backup unsuccessfull. Check log file for more details')
+			old_config = get_latest_config(hostname, None, node.config_file)
+
+		# Only one host at a time updates files in git repository
+		with GIT_LOCK:
+			if host_expired(hostname):
+				raise TimeoutError('Deadline of {} exceeded before config was stored'.format(hostname))
+			node_type.compare_configs(hostname, new_config, old_config)
+	else:
+		print(INDENT + 'ERROR Configuration backup unsuccessfull. Check log file for more details')
+		raise RuntimeError('Configuration backup of {} unsuccessfull: {}'.format(hostname, take_error(hostname)))
+
+	return new_config
 
-def dns_backup(node_type, hosts, username, password):
+def dns_backup(node_type, hosts, username, password, workers=1, deadline=RUN_DEADLINE, host_deadline=HOST_DEADLINE):
 	"""
 	Function that iterates through given Bind DNS hosts for configuration backup.
 	The downloaded config is compared with one stored in git repository 
 	and any files that differ are updated to repository
 
+	Args:
+		node_type:		distinguishing functions for different node types
+		hosts: 			dictionary of the nodes containing HOSTNAME:IP_ADDR
+		username:		user's login to DNS host
+		password:		user's password to DNS host
+		workers:		number of hosts backed up at the same time (default 1)
+		deadline:		time limit in seconds for all hosts (default RUN_DEADLINE)
+		host_deadline:	time limit in seconds for a single host (default HOST_DEADLINE)
+
+	Returns:
+		list of HostResult for given hosts
+	"""
+	def job(hostname, ip):
+		return host_dns_backup(node_type, hostname, ip, username, password)
+
+	return run_on_hosts(job, hosts, workers, deadline, host_deadline, breaker=True, probe=PROBE_ENABLED)
+
+def host_dns_backup(node_type, hostname, ip, username, password):
+	"""
+	Function that backs up configuration and zone files of a single Bind DNS host.
+	The downloaded files are compared with ones stored in git repository 
+	and updated in repository if they differ
+
 	Args:
 		node_type:	distinguishing functions for different node types
-		hosts: 		dictionary of the nodes containing HOSTNAME:IP_ADDR
+		hostname:	DNS host's hostname
+		ip:			DNS host's management ip address
 		username:	user's login to DNS host
 		password:	user's password to DNS host
 
 	Returns:
-		None
+		name of the downloaded DNS config file
 	"""
-	for hostname, ip in hosts.items():
-		print('Backup of DNS host config: ' + hostname)
-		# Path where host's configuraiton files are stored from git repo 
-		path = GIT_PATH + hostname
-		# Path to zone files in git repo
-		zone_path = path + '/zones/'
-		archive_path = zone_path + '/archive/'
-		private_path = zone_path + '/private/'
-		# Create host directory if not in repo yet
-		if not os.path.exists(path):
-			os.mkdir(path, 0o755) # Creates folder with appropriate permissions
-		# Create zones directory if not in repo yet
-		if not os.path.exists(zone_path):
-			os.mkdir(zone_path, 0o755)
-		# Create private zones directory if not in repo yet
-		if not os.path.exists(private_path):
-			os.mkdir(private_path, 0o755)
-		# Create private zone 1 directroy if not in repo yet
-		if not os.path.exists(private_path + 'Priv1'):
-			os.mkdir(private_path + 'Priv1', 0o755)
-		# Create private zone 2 directroy if not in repo yet
-		if not os.path.exists(private_path + 'Priv2'):
-			os.mkdir(private_path + 'Priv2', 0o755)
-		# Create private zones archive directory if not in repo yet
-		if not os.path.exists(archive_path):
-			os.mkdir(archive_path, 0o755)
-		# Create private zone 1 archive directroy if not in repo yet
-		if not os.path.exists(archive_path + 'Priv1'):
-			os.mkdir(archive_path + 'Priv1', 0o755)
-		# Create private zone 2 archive directroy if not in repo yet
-		if not os.path.exists(archive_path + 'Priv2'):
-			os.mkdir(archive_path + 'Priv2', 0o755)
-		# Get lists of current configuraiton files in git repos
-		old_config = path + '/named.conf'
-		old_zones = get_files_list(zone_path, 'zone.*')
-		old_priv1 = get_files_list(private_path + 'Priv1')
-		old_priv2 = get_files_list(private_path + 'Priv2')
-
-		new_config, new_zones, new_priv1, new_priv2 = node_type.save_config(hostname, ip, username, password)
-
-		while not new_config and new_zones and new_priv1 and new_priv2:
-			pass # wait till all files are downloaded from the host
-
-		print(INDENT + 'Downloaded file: ' + new_config)
-
-		# Compare config files if no errors occured during download 
-		if (new_config != '{}-errors.log'.format(hostname)):
+	print('Backup of DNS host config: ' + hostname)
+	# Path where host's configuraiton files are stored from git repo 
+	path = GIT_PATH + hostname
+	# Path to zone files in git repo
+	zone_path = path + '/zones/'
+	archive_path = zone_path + 'archive/'
+	private_path = zone_path + 'private/'
+	# Each DNS host downloads files to its own temporary folder
+	# so zone files with the same name on different hosts do not collide
+	tmp_path = TMP_PATH + hostname + '/'
+	# Create host, zones, private zones and archive directories if not in repo yet
+	for directory in [path, zone_path, private_path + 'Priv1/', private_path + 'Priv2/',
+		archive_path + 'Priv1/', archive_path + 'Priv2/', tmp_path]:
+		os.makedirs(directory, 0o755, exist_ok=True) # Creates folder with appropriate permissions
+	# Get lists of current configuraiton files in git repos
+	old_config = next(iter(get_files_list(path, 'named.conf')), None)
+	old_zones = get_files_list(zone_path, 'zone.*')
+	old_priv1 = get_files_list(private_path + 'Priv1/')
+	old_priv2 = get_files_list(private_path + 'Priv2/')
+
+	# save_config returns only when all files are downloaded or download failed (retried after transient error)
+	new_config, new_zones, new_priv1, new_priv2 = call_with_retry(hostname, node_type.save_config,
+		hostname, ip, username, password, tmp_path)
+	if not new_config:
+		raise RuntimeError('No configuration file downloaded from {}'.format(hostname))
+
+	print(INDENT + 'Downloaded file: ' + new_config)
+
+	# Compare config files if no errors occured during download 
+	if (new_config != '{}-errors.log'.format(hostname)):
+		# Only one host at a time updates files in git repository
+		with GIT_LOCK:
+			if host_expired(hostname):
+				raise TimeoutError('Deadline of {} exceeded before config was stored'.format(hostname))
 			# Compare main named.conf config file
-			node_type.compare_configs(hostname, new_config, old_config)
+			node_type.compare_configs(hostname, new_config, old_config, tmp_path)
 			# Compare zones configuraiotn file
 			# Note: This depends highly on config files directory structure
-			node_type.files_set(new_zones, old_zones, zone_path, archive_path)
-			node_type.files_set(new_priv1, old_priv1, private_path + 'Priv1', archive_path + 'Priv1')
-			node_type.files_set(new_priv2, old_priv2, private_path + 'Priv2', archive_path + 'Priv2')
+			node_type.files_set(new_zones, old_zones, zone_path, archive_path, tmp_path)
+			node_type.files_set(new_priv1, old_priv1, private_path + 'Priv1/', archive_path + 'Priv1/', tmp_path)
+			node_type.files_set(new_priv2, old_priv2, private_path + 'Priv2/', archive_path + 'Priv2/', tmp_path)
+	else:
+		raise RuntimeError('Configuration backup of {} unsuccessfull: {}'.format(hostname, take_error(hostname)))
 
-def expired_licenses(node_type, hosts, username, password):
+	return new_config
+
+def fleet_license_scan(fleet, username, password, workers=1, deadline=RUN_DEADLINE, host_deadline=HOST_DEADLINE, cache=None):
 	"""
-	Function that iterates through given hosts to validate license.
-	
+	Function that checks licenses of nodes of all given node types in one run.
+	Hosts of every node type share the same pool of workers and the license
+	output is parsed by the node type's license parser.
+	Licenses which expire soon are saved to files for the notification mail.
+	With license cache given, nodes with recently checked license far from
+	expiration are not logged in, their record is taken from the cache
+
 	Args:
-		node_type:	distinguishing functions for different node types
-		hosts: 		dictionary of the nodes containing HOSTNAME:IP_ADDR
-		username:	user's login to host
-		password:	user's password to host
+		fleet:			list of (node_type, hosts) pairs, hosts is dictionary of HOSTNAME:IP_ADDR
+		username:		user's login to host
+		password:		user's password to host
+		workers:		number of hosts checked at the same time (default 1)
+		deadline:		time limit in seconds for all hosts (default RUN_DEADLINE)
+		host_deadline:	time limit in seconds for a single host (default HOST_DEADLINE)
+		cache:			license cache from load_license_cache() updated with checked licenses
 
 	Returns:
-		list of licenses to expire
+		list of LicenseRecord of hosts with successfully checked license
 	"""
-	licenses = []
-	for hostname, ip in hosts.items():
+	node_types = {}
+	hosts = {}
+	for node_type, node_hosts in fleet:
+		if not capabilities(node_type).license:
+			print(INDENT + 'ERROR License check not supported by {} nodes'.format(capabilities(node_type).name))
+			continue
+		for hostname, ip in node_hosts.items():
+			node_types[hostname] = node_type
+			hosts[hostname] = ip
+
+	records = []
+	if cache is not None:
+		cached = [hostname for hostname in hosts if hostname in cache and not needs_refresh(cache[hostname])]
+		records = [cached_record(hostname, cache[hostname]) for hostname in cached]
+		hosts = {hostname: ip for hostname, ip in hosts.items() if hostname not in cached}
+		print(INDENT + 'Using cached license of {} hosts'.format(len(cached)))
+
+	def job(hostname, ip):
+		node_type = node_types[hostname]
 		print('Checking license of ' + hostname)
 		# Get current license info from the node
 		license = exec_cmd(hostname, ip, username, password, node_type.SHOW_LICENSE_INFORMATION_CMD)
-		# Check if license download is successful
-		if license != None:
-			# Validate node license - if expire date is near then returns license file
-			license_file = node_type.validate_license(hostname, license)
-			# Add license to list of expired licences
-			if license_file != None:
-				licenses.append(license_file)
+		expire_date = node_type.license_expire_date(license)
+		if expire_date is None:
+			raise RuntimeError('No license expire date found on {}: {}'.format(hostname, license.strip()))
+		# Validate node license - if expire date is near then returns license file
+		license_file = save_expiring_license(hostname, license, expire_date)
+		if cache is not None:
+			update_license_cache(cache, hostname, expire_date, license)
+		return LicenseRecord(hostname, expire_date, (expire_date - TODAY).days, license_file)
+
+	results = run_on_hosts(job, hosts, workers, deadline, host_deadline, probe=PROBE_ENABLED)
+	for result in results:
+		if result.status != 'ok':
+			print(INDENT + 'ERROR License check of {} unsuccessfull: {}'.format(result.hostname, result.error))
+	return records + [result.output for result in results if result.status == 'ok']
+
+def collect_artifacts(node_type, hosts, username, password, artifacts, workers=1, deadline=RUN_DEADLINE, host_deadline=HOST_DEADLINE, cache=None):
+	"""
+	Function that gathers requested artifacts (config, version, license, inventory)
+	of given hosts using single SSH session per host instead of separate login
+	for every job. Collected config is updated in git repository like in config_backup()
+	and collected license is stored in license cache, so license_alert.py does not
+	log in to the node again while the cached license is fresh
+
+	Args:
+		node_type:		distinguishing functions for different node types
+		hosts: 			dictionary of the nodes containing HOSTNAME:IP_ADDR
+		username:		user's login to host
+		password:		user's password to host
+		artifacts:		list of artifacts to gather e.g. [ARTIFACT_CONFIG, ARTIFACT_LICENSE]
+		workers:		number of hosts processed at the same time (default 1)
+		deadline:		time limit in seconds for all hosts (default RUN_DEADLINE)
+		host_deadline:	time limit in seconds for a single host (default HOST_DEADLINE)
+		cache:			license cache from load_license_cache() updated with collected licenses
+
+	Returns:
+		list of HostResult for given hosts with dictionary of ARTIFACT:VALUE as output
+	"""
+	def job(hostname, ip):
+		return host_collect(node_type, hostname, ip, username, password, artifacts, cache)
+
+	return run_on_hosts(job, hosts, workers, deadline, host_deadline, breaker=True, probe=PROBE_ENABLED)
+
+def host_collect(node_type, hostname, ip, username, password, artifacts, cache=None):
+	"""
+	Function that gathers requested artifacts of a single host
+
+	Args:
+		node_type:	distinguishing functions for different node types
+		hostname:	node's hostname
+		ip:			node's management ip address
+		username:	user's login to host
+		password:	user's password to host
+		artifacts:	list of artifacts to gather
+		cache:		license cache updated with collected license (default None)
+
+	Returns:
+		dictionary of ARTIFACT:VALUE
+	"""
+	# Only artifacts supported by the node type are gathered
+	artifacts = [artifact for artifact in artifacts if artifact in capabilities(node_type).artifacts]
+	print('Collecting ' + ', '.join(artifacts) + ' of host ' + hostname)
+	os.makedirs(GIT_PATH + hostname, 0o755, exist_ok=True)
+	if hasattr(node_type, 'collect'):
+		collected = call_with_retry(hostname, node_type.collect, hostname, ip, username, password, artifacts)
+	else:
+		# Node types without collection plan gather only config
+		collected = {ARTIFACT_CONFIG: call_with_retry(hostname, node_type.save_config, hostname, ip, username, password)}
+
+	if ARTIFACT_CONFIG in collected:
+		store_config(node_type, hostname, collected[ARTIFACT_CONFIG])
+	if ARTIFACT_LICENSE in collected:
+		expire_date = node_type.license_expire_date(collected[ARTIFACT_LICENSE])
+		if expire_date is None:
+			raise RuntimeError('No license expire date found on {}: {}'.format(hostname, collected[ARTIFACT_LICENSE].strip()))
+		if cache is not None:
+			update_license_cache(cache, hostname, expire_date, collected[ARTIFACT_LICENSE])
+
+	missing = [artifact for artifact in artifacts if artifact not in collected]
+	if missing:
+		raise RuntimeError('Unable to collect {} of {}: {}'.format(', '.join(missing), hostname, take_error(hostname)))
+	return collected
 
 def exec_cmd(hostname, ip, username, password, command):
 	"""
@@ -198,10 +479,10 @@ def exec_cmd(hostname, ip, username, password, command):
 	Returns:
 		command output
 	"""
+	ssh = None
 	try:
-		ssh = paramiko.SSHClient()
-		ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-		ssh.connect(ip, username=username, password=password, timeout=30)
+		# Reuse pooled connection to the node if available
+		ssh = SSH_POOL.acquire(ip, username, password, timeout=30)
 		_, output, _ = ssh.exec_command(command)
 		# Wait for the command to execute - required for long command execution
 		output.channel.recv_exit_status()
@@ -211,7 +492,9 @@ def exec_cmd(hostname, ip, username, password, command):
 		cmd_output = str(e)
 	
 	finally:
-		ssh.close()
+		# Return connection to the pool for reuse
+		if ssh is not None:
+			SSH_POOL.release(ssh)
 
 	return cmd_output
 
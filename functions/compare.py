@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+import os
+import errno
+import shutil
+import difflib
+import hashlib
+
+from functions.changeset import record_change
+from functions.hash_index import get_digest, set_digest
+from functions.variables import INDENT, COMPARE_CONFIG_IGNORE, COMPARE_CONFIG_REPLACE, COMPARE_CONFIG_ADD
+
+# Results of the config comparison
+CONFIG_SAME = 'same' # Downloaded config removed - same config in git repo
+CONFIG_CHANGED = 'changed' # Config replaced in git repo
+CONFIG_ADDED = 'added' # Config added to git repo
+
+# Size of the block read from config file at once
+READ_BLOCK = 1024 * 1024
+# Maximum number of diff lines printed for changed config
+DIFF_MAX_LINES = 100
+
+
+def normalized_lines(file_path, ignore=()):
+	"""
+	Function that yields lines of the file that are relevant for comparison.
+	Every single line containing any of the ignore strings is skipped - unlike
+	"diff -I", which ignores only changed hunks whose lines all match
+
+	Args:
+		file_path:	path to the file
+		ignore:		list of strings marking lines to skip (e.g. '+B' for hashed passwords)
+
+	Returns:
+		generator of file lines in bytes
+	"""
+	ignore = [rule.encode('utf-8') for rule in ignore]
+	with open(file_path, 'rb') as f:
+		for line in f:
+			if not any(rule in line for rule in ignore):
+				yield line
+
+def file_digest(file_path, ignore=()):
+	"""
+	Function that calculates SHA-256 digest of the file content relevant for comparison
+
+	Args:
+		file_path:	path to the file
+		ignore:		list of strings marking lines to skip
+
+	Returns:
+		hex digest of normalized file content
+	"""
+	digest = hashlib.sha256()
+	if ignore:
+		for line in normalized_lines(file_path, ignore):
+			digest.update(line)
+	else:
+		# Without ignore rules the file is hashed in big blocks
+		with open(file_path, 'rb') as f:
+			for block in iter(lambda: f.read(READ_BLOCK), b''):
+				digest.update(block)
+	return digest.hexdigest()
+
+def stored_digest(file_path, ignore=()):
+	"""
+	Function that returns digest of the file stored in git repo.
+	Digest is taken from hash index and calculated only if not indexed yet
+
+	Args:
+		file_path:	path to the file in git repo
+		ignore:		list of strings marking lines to skip
+
+	Returns:
+		hex digest of normalized file content
+	"""
+	digest = get_digest(file_path, ignore)
+	if digest is None:
+		digest = file_digest(file_path, ignore)
+		set_digest(file_path, digest, ignore)
+	return digest
+
+def same_as_stored(new_file, stored_file, ignore=()):
+	"""
+	Function that checks if downloaded file is the same as one stored in git repo.
+	Only downloaded file is read if the stored one is already indexed
+
+	Args:
+		new_file:		path to the downloaded file
+		stored_file:	path to the file stored in git repo
+		ignore:			list of strings marking lines to skip
+
+	Returns:
+		True if files are the same otherwise False
+	"""
+	return file_digest(new_file, ignore) == stored_digest(stored_file, ignore)
+
+def unified_diff(new_file, old_file, ignore=()):
+	"""
+	Function that returns unified diff of two files without ignored lines.
+	Should be called only if files differ as it reads both files to memory
+
+	Args:
+		new_file:	path to the downloaded file
+		old_file:	path to the file stored in git repo
+		ignore:		list of strings marking lines to skip
+
+	Returns:
+		list of unified diff lines without new line characters
+	"""
+	new_lines = [line.decode('utf-8', 'replace').rstrip('\r\n') for line in normalized_lines(new_file, ignore)]
+	old_lines = [line.decode('utf-8', 'replace').rstrip('\r\n') for line in normalized_lines(old_file, ignore)]
+	return list(difflib.unified_diff(old_lines, new_lines, old_file, new_file, lineterm=''))
+
+def print_diff(new_file, old_file, ignore=()):
+	"""
+	Function that prints changes of the config as unified diff limited to DIFF_MAX_LINES lines.
+	Printed at once, so diffs of hosts processed at the same time are not mixed
+
+	Args:
+		new_file:	path to the downloaded file
+		old_file:	path to the file stored in git repo
+		ignore:		list of strings marking lines to skip
+	"""
+	lines = unified_diff(new_file, old_file, ignore)
+	if len(lines) > DIFF_MAX_LINES:
+		lines = lines[:DIFF_MAX_LINES] + ['... {} more lines'.format(len(lines) - DIFF_MAX_LINES)]
+	# Line endings are not shown, so config differing only in them has empty diff
+	if lines:
+		print('\n'.join(INDENT * 2 + line for line in lines))
+
+def move_file(file_path, dest_path):
+	"""
+	Function that moves file to given directory or file path.
+	Falls back to copy when the destination is on different filesystem
+
+	Args:
+		file_path:	path to the file to move
+		dest_path:	destination directory (ending with '/') or file path
+
+	Returns:
+		path of the moved file
+	"""
+	if dest_path.endswith('/'):
+		dest_path = dest_path + os.path.basename(file_path)
+	try:
+		os.replace(file_path, dest_path)
+	except OSError as e:
+		if e.errno != errno.EXDEV:
+			raise
+		shutil.move(file_path, dest_path)
+	# Both source and destination are recorded as only those in git repo are kept
+	record_change(file_path)
+	record_change(dest_path)
+	return dest_path
+
+def remove_file(file_path):
+	"""Remove file if it exists"""
+	try:
+		os.unlink(file_path)
+	except FileNotFoundError:
+		pass
+
+def compare_and_store(new_config, repo_path, old_config_name, ignore=()):
+	"""
+	Function that compares downloaded config with one stored in git repo.
+	If configs differ then changes are printed and new one is moved to repo path,
+	otherwise it is removed. Diff is produced only for changed config
+
+	Args:
+		new_config:			path to the config downloaded from the node
+		repo_path:			path to the node's folder in git repo (ending with '/')
+		old_config_name:	config file name stored in git repo or None
+		ignore:				list of strings marking lines to skip
+
+	Returns:
+		CONFIG_SAME, CONFIG_CHANGED or CONFIG_ADDED
+	"""
+	new_digest = file_digest(new_config, ignore)
+	# If config file names are the same (e.g. same SW version) then compare configs
+	if (os.path.basename(new_config) == old_config_name):
+		if new_digest == stored_digest(repo_path + old_config_name, ignore):
+			# If configs are the same then remove downloaded config file
+			print(COMPARE_CONFIG_IGNORE)
+			remove_file(new_config)
+			return CONFIG_SAME
+		# If configs differs then move downloaded file to git repo
+		print(COMPARE_CONFIG_REPLACE)
+		print_diff(new_config, repo_path + old_config_name, ignore)
+		set_digest(move_file(new_config, repo_path), new_digest, ignore)
+		return CONFIG_CHANGED
+	# If config file names differs (e.g. different SW version) then move downloaded file to git repo
+	print(COMPARE_CONFIG_ADD)
+	set_digest(move_file(new_config, repo_path), new_digest, ignore)
+	return CONFIG_ADDED
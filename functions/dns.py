@@ -1,19 +1,52 @@
 #!/usr/bin/env python3
-import paramiko
-import subprocess
+import os
+import shutil
+import fnmatch
+import tarfile
 
+from functions.changeset import record_change
+from functions.compare import compare_and_store, same_as_stored, stored_digest, move_file, remove_file, CONFIG_SAME
 from functions.git import GIT_PATH
-from functions.variables import TMP_PATH, DATE
+from functions.metrics import Stopwatch, timed
+from functions.retry import record_error
+from functions.ssh_pool import SSH_POOL
+from functions.variables import TMP_PATH, DATE, DNS_SYNC_MODE, COMPARE_CONFIG_IGNORE
 
-def save_config(hostname, ip, username, password):
+SFTP_PATH = '/var/named/' # Path where Bind DNS config
+ZONES_PATH = SFTP_PATH + 'zones/' # Path to zone files
+PRIVATE_PATH = ZONES_PATH + 'private/' # Path to private zone files
+FILE_NAME = 'named.conf' # Bind DNS config file
+
+# Config file name scheme - single named.conf per host
+CONFIG_FILE_SCHEME = FILE_NAME
+# Software version is part of the config file name
+VERSIONED_CONFIG = False
+# License of the node can be checked
+LICENSE_SUPPORT = False
+# Config & zone files are compared without ignored lines
+IGNORE_RULES = []
+
+# DNS files synchronization modes
+SYNC_FULL = 'full' # Download all files
+SYNC_INCREMENTAL = 'incremental' # Download only files with checksum different than in git repo
+SYNC_ARCHIVE = 'archive' # Download all files as single compressed tar stream
+
+@timed('save_config')
+def save_config(hostname, ip, username, password, tmp_path=None, mode=DNS_SYNC_MODE):
 	"""
-	Function that download Bind DNS zones configuraiton
+	Function that download Bind DNS zones configuraiton.
+	In incremental mode only files which checksum differs from the copy
+	in git repo are downloaded, the rest is left out of tmp_path.
+	In archive mode all files are transferred as one tar stream
 
 	Args:
 		hostname: 	DNS server hostname
 		ip: 		DNS host's ip address
 		username:	user's login to DNS host
 		password:	user's password to DNS host
+		tmp_path:	host's own temporary folder where files are downloaded, emptied first
+					(default TMP_PATH + hostname + '/')
+		mode:		SYNC_FULL, SYNC_INCREMENTAL or SYNC_ARCHIVE (default DNS_SYNC_MODE)
 
 	Returns:
 		FILE_NAME: 		DNS config file - named.conf
@@ -21,57 +54,191 @@ def save_config(hostname, ip, username, password):
 		private1_zones: list of configured private 1 zones
 		private2_zones: list of configured private 2 zones
 	"""
-	SFTP_PATH = '/var/named/' # Path where Bind DNS config
-	ZONES_PATH = SFTP_PATH + 'zones/' # Path to zone files
-	PRIVATE_PATH = ZONES_PATH + 'private/' # Path to private zone files
-	FILE_NAME = 'named.conf' # Bind DNS config file
+	file_name = FILE_NAME
+	# Path to host's files in git repo
+	repo_path = GIT_PATH + hostname + '/'
 	# Initialization of empty lists
-	zones, private1_zones, private2_zones = [], []
+	zones, private1_zones, private2_zones = [], [], []
+	if tmp_path is None:
+		tmp_path = TMP_PATH + hostname + '/'
+	# Files left by previous run or failed attempt would be compared as downloaded now
+	shutil.rmtree(tmp_path, ignore_errors=True)
+	os.makedirs(tmp_path, 0o755, exist_ok=True)
 
+	ssh = None
+	stopwatch = Stopwatch()
 	try:
-		ssh = paramiko.SSHClient()
-		ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-		ssh.connect(ip, username=username, password=password, timeout=30)
-
-		# Check zones configured in DNS
-		_, output, _ = ssh.exec_command(f'cd {ZONES_PATH}; ls zone.*')
-		zones = output.read().decode('utf-8').split()
-		# Check private 1 zones configured in DNS
-		_, output, _ = ssh.exec_command(f'cd {PRIVATE_PATH}priv1; ls')
-		private1_zones = output.read().decode('utf-8').split()
-		# Check private 2 zones configured in DNS
-		_, output, _ = ssh.exec_command(f'cd {PRIVATE_PATH}priv2; ls')
-		private2_zones = output.read().decode('utf-8').split()
-
-		# Open SFTP connection to download DNS config & zone files
-		sftp = ssh.open_sftp()
-		# Download DNS config file
-		sftp.get(SFTP_PATH + FILE_NAME, TMP_PATH + FILE_NAME)
-		# Download zone files
-		for zone_file in zones:
-			sftp.get(ZONES_PATH + zone_file, TMP_PATH + zone_file)
-		# Download private 1 zones
-		for zone_file in private1_zones:
-			sftp.get(PRIVATE_PATH + 'priv1/' + zone_file, TMP_PATH + zone_file)
-		# Download private 1 zones
-		for zone_file in private2_zones:
-			sftp.get(PRIVATE_PATH + 'priv2/' + zone_file, TMP_PATH + zone_file)
+		# Reuse pooled connection to the node if available
+		ssh = SSH_POOL.acquire(ip, username, password, timeout=30)
+		stopwatch.lap('connect')
 
-		# Close SFTP connection
-		sftp.close()
+		if mode == SYNC_ARCHIVE:
+			zones, private1_zones, private2_zones = archive_download(ssh, tmp_path)
+		else:
+			zones, private1_zones, private2_zones = sftp_download(ssh, repo_path, tmp_path, mode)
+		stopwatch.lap('download')
 
 	except Exception as e:
 		# Any exception is logged to file with current date
-		FILE_NAME = f'{hostname}-errors.log'
+		file_name = f'{hostname}-errors.log'
 		log = DATE + ' : ' + str(e)
-		with open(GIT_PATH + hostname + '/' + FILE_NAME, 'a') as f:
+		with open(GIT_PATH + hostname + '/' + file_name, 'a') as f:
 			f.write(log + '\n')
+		record_change(GIT_PATH + hostname + '/' + file_name)
+		record_error(hostname, e)
 
 	finally:
-		ssh.close()
+		# Return connection to the pool for reuse
+		if ssh is not None:
+			SSH_POOL.release(ssh)
+
+	return (file_name, zones, private1_zones, private2_zones)
+
+def sftp_download(ssh, repo_path, tmp_path, mode=SYNC_FULL):
+	"""
+	Function that downloads DNS config & zone files one by one over SFTP
+
+	Args:
+		ssh:		connected paramiko SSHClient
+		repo_path:	path to host's folder in git repo
+		tmp_path:	path to temporary folder where files are downloaded
+		mode:		SYNC_FULL or SYNC_INCREMENTAL (default SYNC_FULL)
+
+	Returns:
+		lists of zones, private 1 zones and private 2 zones configured in DNS
+	"""
+	# Checksums of DNS config, zones, private 1 & private 2 zones configured in DNS
+	config = remote_checksums(ssh, SFTP_PATH, FILE_NAME)
+	zones = remote_checksums(ssh, ZONES_PATH, 'zone.*')
+	private1_zones = remote_checksums(ssh, PRIVATE_PATH + 'priv1')
+	private2_zones = remote_checksums(ssh, PRIVATE_PATH + 'priv2')
+
+	# Files to download from remote folder to git repo folder
+	downloads = [
+		(SFTP_PATH, repo_path, config),
+		(ZONES_PATH, repo_path + 'zones/', zones),
+		(PRIVATE_PATH + 'priv1/', repo_path + 'zones/private/Priv1/', private1_zones),
+		(PRIVATE_PATH + 'priv2/', repo_path + 'zones/private/Priv2/', private2_zones),
+	]
+
+	# Open SFTP connection to download DNS config & zone files
+	sftp = ssh.open_sftp()
+	try:
+		for remote_path, local_path, checksums in downloads:
+			files = list(checksums)
+			if mode == SYNC_INCREMENTAL:
+				files = changed_files(checksums, local_path)
+			for file in files:
+				sftp.get(remote_path + file, tmp_path + file)
+	finally:
+		# Close SFTP connection
+		sftp.close()
+
+	return list(zones), list(private1_zones), list(private2_zones)
+
+def archive_download(ssh, tmp_path):
+	"""
+	Function that downloads DNS config & zone files as one compressed tar
+	streamed over SSH channel and unpacks them to temporary folder on the fly
+
+	Args:
+		ssh:		connected paramiko SSHClient
+		tmp_path:	path to temporary folder where files are unpacked
 
-	return (FILE_NAME, zones, private1_zones, private2_zones)
+	Returns:
+		lists of zones, private 1 zones and private 2 zones configured in DNS
+	"""
+	zones, private1_zones, private2_zones = [], [], []
+	# Archive folder: list of files unpacked from that folder
+	folders = {
+		'zones': zones,
+		'zones/private/priv1': private1_zones,
+		'zones/private/priv2': private2_zones,
+	}
+	_, output, _ = ssh.exec_command(f'tar -czf - -C {SFTP_PATH} {FILE_NAME} zones')
+	# Stream mode reads the archive sequentially without seeking
+	with tarfile.open(fileobj=output, mode='r|gz') as tar:
+		for member in tar:
+			if not member.isfile():
+				continue
+			folder, file = os.path.split(os.path.normpath(member.name))
+			if folder == 'zones' and not fnmatch.fnmatch(file, 'zone.*'):
+				continue
+			if folder in folders:
+				folders[folder].append(file)
+			elif member.name != FILE_NAME:
+				continue
+			with tar.extractfile(member) as src, open(tmp_path + file, 'wb') as dst:
+				shutil.copyfileobj(src, dst)
+	if output.channel.recv_exit_status() != 0:
+		raise RuntimeError('Unable to archive DNS files on remote host')
+
+	return zones, private1_zones, private2_zones
+
+def remote_checksums(ssh, path, pattern='*'):
+	"""
+	Function that lists files in remote folder with their SHA-256 checksums
+	using single command. Missing folder or no matching file is empty listing,
+	any other failure raises, so files are never taken as removed from DNS by mistake
+
+	Args:
+		ssh:		connected paramiko SSHClient
+		path:		remote folder
+		pattern:	pattern of the files to list (default '*')
+
+	Returns:
+		dictionary of FILE_NAME:SHA256
+	"""
+	_, output, error = ssh.exec_command(
+		f"[ -d {path} ] || exit 0; cd {path} && find . -maxdepth 1 -type f -name '{pattern}' -exec sha256sum {{}} +")
+	lines = output.read().decode('utf-8').splitlines()
+	if output.channel.recv_exit_status() != 0:
+		raise RuntimeError('Unable to list files in {} on remote host: {}'.format(path,
+			error.read().decode('utf-8', 'replace').strip()))
+	checksums = {}
+	# Line format: <sha256>  ./<file name>
+	for line in lines:
+		digest, name = line.split(None, 1)
+		name = name.lstrip('*')
+		checksums[name[2:] if name.startswith('./') else name] = digest
+	return checksums
+
+def changed_files(checksums, local_path):
+	"""
+	Function that finds files which checksum differs from the copy stored in git repo
+
+	Args:
+		checksums:	dictionary of FILE_NAME:SHA256 of remote files
+		local_path:	path to the folder in git repo
+
+	Returns:
+		list of files to download
+	"""
+	return [file for file, digest in checksums.items()
+		if not os.path.isfile(local_path + file) or stored_digest(local_path + file) != digest]
+
+@timed('compare')
+def compare_configs(hostname, config_name, old_config_name, file_tmp_path=TMP_PATH):
+	"""
+	Function that compares downloaded named.conf with one stored in git repo.
+	If configs differs then new one is moved to repo path
+
+	Args:
+		hostname:		DNS server hostname
+		config_name:	config file name downloaded from the host
+		old_config_name: config file name stored in git repo or None
+		file_tmp_path: 	path to temporary folder where config is downloaded (default TMP_PATH)
+
+	Returns:
+		CONFIG_SAME, CONFIG_CHANGED or CONFIG_ADDED
+	"""
+	# Config not downloaded in incremental mode is the same as in git repo
+	if not os.path.exists(file_tmp_path + config_name):
+		print(COMPARE_CONFIG_IGNORE)
+		return CONFIG_SAME
+	return compare_and_store(file_tmp_path + config_name, GIT_PATH + hostname + '/', old_config_name)
 
+@timed('compare')
 def files_set(new_file_list, old_file_list, file_path, file_archive_path, file_tmp_path='/tmp/'):
 	"""
 	Function that gets two list of files to compare their content.
@@ -111,11 +278,13 @@ def compare_files(file_list, file_path, file_tmp_path):
 		None
 	"""
 	for file in file_list:
-		diff_results = subprocess.run(['diff', '-u', file_path + file, file_tmp_path + file], stdout=subprocess.PIPE)
-		if diff_results.returncode == 0:
-			subprocess.run(['rm', file_tmp_path + file], stdout=subprocess.PIPE)
+		# Files not downloaded in incremental mode are the same as in git repo
+		if not os.path.exists(file_tmp_path + file):
+			continue
+		if same_as_stored(file_tmp_path + file, file_path + file):
+			remove_file(file_tmp_path + file)
 		else:
-			subprocess.run(['mv', file_tmp_path + file, file_path], stdout=subprocess.PIPE)
+			move_file(file_tmp_path + file, file_path)
 
 def add_files(file_list, file_path, file_tmp_path):
 	"""
@@ -130,7 +299,7 @@ def add_files(file_list, file_path, file_tmp_path):
 		None
 	"""
 	for file in file_list:
-		subprocess.run(['mv', file_tmp_path + file, file_path], stdout=subprocess.PIPE)
+		move_file(file_tmp_path + file, file_path)
 
 def archive_files(file_list, file_path, file_archive_path):
 	"""
@@ -145,4 +314,4 @@ def archive_files(file_list, file_path, file_archive_path):
 		None
 	"""
 	for file in file_list:
-		subprocess.run(['mv', file_path + file, file_archive_path], stdout=subprocess.PIPE)
\ No newline at end of file
+		move_file(file_path + file, file_archive_path)
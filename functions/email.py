@@ -1,11 +1,11 @@
 #!/usr/bin/env python3
 import os
+import uuid
+import base64
 import smtplib
-import sys
-from email import encoders
-from email.mime.base import MIMEBase
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+from collections import namedtuple
+from email.header import Header
+from email.utils import formatdate
 
 from functions.variables import TMP_PATH
 
@@ -16,59 +16,197 @@ DEFAULT_SERVER = '192.168.0.60'
 DEFAULT_SERVER_PORT =  8025
 DEFAULT_SERVER_LOGIN = 'licensebot'
 DEFAULT_SERVER_PASSWORD = 'CHANGE_ME'
+# Time limit in seconds for connect and every SMTP command
+DEFAULT_SERVER_TIMEOUT = 60
 
-def send_mail(send_from, send_to, subject, body, attachments=None,
+# Size of attachment block encoded at once - multiple of 57 bytes (one 76 character base64 line)
+# so encoded blocks join to valid base64 lines
+BASE64_BLOCK = 57 * 1024
+
+# Single email message of the batch
+# 	send_to:		email recipients
+# 	subject:		email subject
+# 	body:			content of the email message in HTML format
+# 	attachments:	files in TMP_PATH to attach to the email message or None
+Digest = namedtuple('Digest', ['send_to', 'subject', 'body', 'attachments'])
+
+
+class Mailer:
+	"""
+	Mail sender keeping one authenticated SMTP session for a batch of messages.
+	Message is written to the SMTP connection while it is generated, attachments
+	are base64 encoded block by block, so whole files are never held in memory
+	"""
+
+	def __init__(self, server=DEFAULT_SERVER, server_port=DEFAULT_SERVER_PORT,
+		server_login=DEFAULT_SERVER_LOGIN, server_password=DEFAULT_SERVER_PASSWORD, timeout=DEFAULT_SERVER_TIMEOUT):
+		self.server = server
+		self.server_port = server_port
+		self.server_login = server_login
+		self.server_password = server_password
+		self.timeout = timeout
+		self.smtp = None
+
+	def __enter__(self):
+		self.open()
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+
+	def open(self):
+		"""Connect and log in to relay mail server if not connected yet"""
+		if self.smtp is None:
+			smtp = smtplib.SMTP(self.server, self.server_port, timeout=self.timeout)
+			try:
+				smtp.ehlo()
+				smtp.login(self.server_login, self.server_password)
+			except:
+				smtp.close()
+				raise
+			self.smtp = smtp
+
+	def close(self):
+		"""Close SMTP session"""
+		if self.smtp is not None:
+			try:
+				self.smtp.quit()
+			except (smtplib.SMTPException, OSError):
+				self.smtp.close()
+			self.smtp = None
+
+	def abort(self):
+		"""Drop SMTP session in unknown state (e.g. message half written) without waiting for the server"""
+		if self.smtp is not None:
+			self.smtp.close()
+			self.smtp = None
+
+	def send(self, send_from, send_to, subject, body, attachments=None):
+		"""
+		Function that sends email message in the open SMTP session.
+		Attachments are opened before the message is started, error while
+		the message is written drops the session - next message opens new one
+
+		Args:
+			send_from: 		email sender
+			send_to:		email recipients
+			subject: 		email subject
+			body:			content of the email message in HTML format
+			attachments: 	files in TMP_PATH to attach to the email message
+
+		Returns:
+			dictionary of recipients refused by the server
+		"""
+		# Missing attachment fails the message before the server enters DATA mode
+		files = []
+		try:
+			for file in attachments or []:
+				files.append((os.path.basename(file), open(TMP_PATH + file, 'rb')))
+			return self.send_files(send_from, send_to, subject, body, files)
+		finally:
+			for _, f in files:
+				f.close()
+
+	def send_files(self, send_from, send_to, subject, body, files):
+		"""Send email message with attachments given as list of (file name, open binary file)"""
+		self.open()
+		smtp = self.smtp
+		code, response = smtp.mail(send_from)
+		if code != 250:
+			smtp.rset()
+			raise smtplib.SMTPSenderRefused(code, response, send_from)
+		refused = {}
+		for recipient in send_to:
+			code, response = smtp.rcpt(recipient)
+			if code not in (250, 251):
+				refused[recipient] = (code, response)
+		if len(refused) == len(send_to):
+			smtp.rset()
+			raise smtplib.SMTPRecipientsRefused(refused)
+
+		code, response = smtp.docmd('data')
+		if code != 354:
+			smtp.rset()
+			raise smtplib.SMTPDataError(code, response)
+		try:
+			self.write_message(send_from, send_to, subject, body, files)
+			# End of data - all lines of the message are base64 or headers, none starts with '.'
+			smtp.send(b'\r\n.\r\n')
+			code, response = smtp.getreply()
+		except:
+			# Server is left in DATA mode - the session can not be used anymore
+			self.abort()
+			raise
+		if code != 250:
+			raise smtplib.SMTPDataError(code, response)
+		return refused
+
+	def write_message(self, send_from, send_to, subject, body, files=()):
+		"""Write multipart MIME message to SMTP data stream"""
+		boundary = '=====' + uuid.uuid4().hex
+		headers = [
+			'Subject: ' + Header(subject, 'utf-8').encode(),
+			'To: ' + COMMASPACE.join(send_to),
+			'From: ' + send_from,
+			'Date: ' + formatdate(localtime=True),
+			'MIME-Version: 1.0',
+			'Content-Type: multipart/mixed; boundary="{}"'.format(boundary),
+		]
+		self.write_lines(headers + [''])
+
+		# Content of the mail message in HTML format
+		self.write_lines([
+			'--' + boundary,
+			'Content-Type: text/html; charset="utf-8"',
+			'Content-Transfer-Encoding: base64',
+			'',
+		])
+		self.smtp.send(base64.encodebytes(body.encode('utf-8')).replace(b'\n', b'\r\n'))
+
+		# Add email attachments if available
+		for file_name, f in files:
+			self.write_lines([
+				'--' + boundary,
+				'Content-Type: application/octet-stream',
+				'Content-Transfer-Encoding: base64',
+				'Content-Disposition: attachment; filename="{}"'.format(file_name),
+				'',
+			])
+			for block in iter(lambda: f.read(BASE64_BLOCK), b''):
+				self.smtp.send(base64.encodebytes(block).replace(b'\n', b'\r\n'))
+		self.write_lines(['--' + boundary + '--'])
+
+	def write_lines(self, lines):
+		"""Write lines terminated with CRLF to SMTP data stream"""
+		self.smtp.send(''.join(line + '\r\n' for line in lines).encode('utf-8'))
+
+
+def send_digests(send_from, digests,
 	server=DEFAULT_SERVER,
 	server_port=DEFAULT_SERVER_PORT,
 	server_login=DEFAULT_SERVER_LOGIN,
 	server_password=DEFAULT_SERVER_PASSWORD):
 	"""
-	Function that sends email using given relay mail servers
+	Function that sends batch of email messages in single SMTP session.
+	Digest which can not be sent is logged and the rest of the batch is sent
 
 	Args:
 		send_from: 		email sender
-		send_to:		email recipients
-		subject: 		email subject
-		body:			content of the email message
-		attachments: 	files to attach to the email message
-		server: 		relay mail server 
+		digests:		list of Digest to send
+		server: 		relay mail server
 		server_port: 	relay mail server SNMP port
 		server_login:	relay mail server login (SNMP access)
 		server_password: relay mail server password (SNMP access)
 
 	Returns:
-		None
+		list of Digest which were not sent
 	"""
-	message = MIMEMultipart()
-
-	message['Subject'] = subject
-	message['To'] = COMMASPACE.join(send_to)
-	message['From'] = send_from
-
-	# Content of the mail message in HTML format
-	message.attach(MIMEText(body, 'html'))
-
-	# Add email attachment if available
-	if attachments != None:
-		for file in attachments:
+	failed = []
+	with Mailer(server, server_port, server_login, server_password) as mailer:
+		for digest in digests:
 			try:
-				with open(TMP_PATH + file, 'rb') as f:
-					att = MIMEBase('application', 'octet-stream')
-					att.set_payload(f.read())
-				encoders.encode_base64(att)
-				att.add_header('Content-Disposition', 'attachment', filename=os.path.basename(file))
-				message.attach(att)
-			except:
-				print('Unable to open ' + file + ' - Error: ' + sys.exc_info()[0])
-				raise
-
-	# Sen email message
-	try:
-		with smtplib.SMTP(server, server_port) as server:
-			server.ehlo()
-			server.login(server_login, server_password)
-			server.sendmail(send_from, send_to, message.as_string())
-			server.close()
-	except:
-		print("Unable to send email. Error: ", sys.exc_info()[0])
-		raise
\ No newline at end of file
+				mailer.send(send_from, digest.send_to, digest.subject, digest.body, digest.attachments)
+			except (smtplib.SMTPException, OSError) as e:
+				print('Unable to send email to {}. Error: {}'.format(COMMASPACE.join(digest.send_to), e))
+				failed.append(digest)
+	return failed
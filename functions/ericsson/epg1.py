@@ -1,16 +1,32 @@
 #/usr/bin/env python
-import paramiko
-import subprocess
-import datetime
 from paramiko_expect import SSHClientInteraction
 
+from functions.capture import capture_to_file
+from functions.changeset import record_change
+from functions.compare import compare_and_store
+from functions.expect import expect
 from functions.git import GIT_PATH
-from functions.variables import TMP_PATH, DATE, TODAY, INDENT, LICENSE_EXTENSION, USERNAME, COMPARE_CONFIG_IGNORE, COMPARE_CONFIG_REPLACE, COMPARE_CONFIG_ADD
+from functions.metrics import Stopwatch, timed
+from functions.retry import record_error
+from functions.ssh_pool import SSH_POOL
+from functions.variables import TMP_PATH, DATE, USERNAME, ARTIFACT_CONFIG
+
+# Comment lines and lines with hashed passwords - differ every time config is generated
+IGNORE_RULES = ['!', '+']
+# Artifacts which can be gathered from the node
+ARTIFACTS = [ARTIFACT_CONFIG]
+# Config file name scheme
+CONFIG_FILE_SCHEME = '{hostname}_{version}.cfg'
+# Software version is part of the config file name
+VERSIONED_CONFIG = True
+# License check is disabled until license output of the node is verified
+LICENSE_SUPPORT = False
 
 # Path to sftp folder on Ericsson node where SFTP download is enabled
 SFTP_PATH = '/flash/'
 
 
+@timed('save_config')
 def save_config(hostname, ip, username, password):
 	"""
 	Downloads current configuration of Ericsson EPG 1.X node
@@ -28,44 +44,52 @@ def save_config(hostname, ip, username, password):
 	PROMPT = '.*\[local\]{}#.*'.format(hostname)
 	PROMPT_EXEC = '.*{}@{}>.*'.format(USERNAME, hostname)
 	PROMPT_BASH = '.*bash-.*$.*'
-	PROMPT_CONFIRM = '.*(y/n).*'
 
+	ssh = interact = None
+	stopwatch = Stopwatch()
 	try:
-		ssh = paramiko.SSHClient()
-		ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-		ssh.connect(ip, username=username, password=password, timeout=30)
-		interact = SSHClientInteraction(ssh, timeout=60, display=SSH_DISPLAY_LOGGING)
-		interact.expect(PROMPT)
+		# Reuse pooled connection to the node if available
+		ssh = SSH_POOL.acquire(ip, username, password, timeout=30)
+		stopwatch.lap('connect')
+		interact = SSHClientInteraction(ssh, timeout=60, display=False)
+		expect(interact, PROMPT)
+		stopwatch.lap('prompt')
 		# Checking software version on the node
 		interact.send('start shell')
-		interact.expect(PROMPT_BASH)
+		expect(interact, PROMPT_BASH)
 		interact.send('show_epg_version |grep -v +')
-		interact.expect(PROMPT_BASH)
+		expect(interact, PROMPT_BASH)
 		version = interact.current_output_clean.split('\n')
 		interact.send('exit')
-		interact.expect(PROMPT)
+		expect(interact, PROMPT)
+		stopwatch.lap('version')
 		# Puts node version into file name
 		for line in version:
-			if ('version') in line:
-				file_name = '{}_{}.cfg'.format(hostname, line.split()[4])
+			if ('version') in line and 'show_epg_version' not in line: # Skip command echo
+				file_name = CONFIG_FILE_SCHEME.format(hostname=hostname, version=line.split()[4])
 		# Save the node configuration
 		interact.send('start oam-cli')
-		interact.expect(PROMPT_EXEC)
-		interact.send('show-config')
-		interact.expect(PROMPT_EXEC)
-		# Save the EPG 1.X config output to file
-		with open(TMP_PATH + file_name, 'a+') as f:
-			f.write(interact.current_output_clean)
+		expect(interact, PROMPT_EXEC)
+		# Save the EPG 1.X config output to file while it is received
+		capture_to_file(interact, 'show-config', PROMPT_EXEC, TMP_PATH + file_name)
+		stopwatch.lap('export')
 	except Exception as e:
 		# Any exception is logged to file with current date
 		file_name = '{}-errors.log'.format(hostname)
 		log = DATE + ' : ' + str(e)
 		with open(GIT_PATH + hostname + '/' + file_name, 'a') as f:
 			f.write(log + '\n')		
+		record_change(GIT_PATH + hostname + '/' + file_name)
+		record_error(hostname, e)
 	finally:
-		ssh.close()
+		# Close only the interactive channel and return connection to the pool
+		if interact is not None:
+			interact.close()
+		if ssh is not None:
+			SSH_POOL.release(ssh)
 	return file_name
 
+@timed('compare')
 def compare_configs(hostname, config_name, old_config_name):
 	"""
 	Compares configuration file downloaded from the node with one stored in SSC EPC
@@ -78,29 +102,6 @@ def compare_configs(hostname, config_name, old_config_name):
 		old_config_name: 	name of the configuration file stored in gitlab repo
 
 	Retruns:
-		None
+		CONFIG_SAME, CONFIG_CHANGED or CONFIG_ADDED
 	"""
-
-	new_config = TMP_PATH + config_name
-	old_config_path = GIT_PATH + hostname + '/'
-
-	# If config file names are the same (e.g. sw version matches) then compare configs
-	if (config_name == old_config_name):
-		# Compare configs "-I +" flag ommits lines with hashed passwords (e.g. user passwords)
-		# Everytime a config file is generated the hash differs and it's not relevant for config changes 
-		diff_results = subprocess.run(['diff', '-u', '-I', '!', '-I', '+', new_config, old_config_path + old_config_name], stdout=subprocess.PIPE)
-		if diff_results.returncode == 0:
-			# If configs are the same then remove downloaded config file
-			print(COMPARE_CONFIG_IGNORE)
-			subprocess.run(['rm', new_config], stdout=subprocess.PIPE)
-		else:
-			# If configs differs then move downloaded file to git repo
-			print(COMPARE_CONFIG_REPLACE)
-			subprocess.run(['mv', new_config, old_config_path], stdout=subprocess.PIPE)
-	# If config file names differs (e.g. different SW version) then move downloaded file to git repo
-	else:
-		print(COMPARE_CONFIG_ADD)
-		subprocess.run(['mv', new_config, old_config_path], stdout=subprocess.PIPE)
-
-def validate_license(hostname, license):
-	pass
\ No newline at end of file
+	return compare_and_store(TMP_PATH + config_name, GIT_PATH + hostname + '/', old_config_name, IGNORE_RULES)
\ No newline at end of file
@@ -1,18 +1,31 @@
 #!/usr/bin/env python3
-import paramiko
-import subprocess
-import datetime
 from paramiko_expect import SSHClientInteraction
 
+from functions.changeset import record_change
+from functions.compare import compare_and_store
+from functions.expect import expect
 from functions.git import GIT_PATH
-from functions.variables import TMP_PATH, DATE, TODAY, INDENT, USERNAME, LICENSE_EXTENSION, COMPARE_CONFIG_IGNORE, COMPARE_CONFIG_REPLACE, COMPARE_CONFIG_ADD
+from functions.metrics import Stopwatch, timed
+from functions.retry import record_error
+from functions.ssh_pool import SSH_POOL
+from functions.variables import TMP_PATH, DATE, USERNAME, ARTIFACT_CONFIG
+
+# Comment lines - config file is saved with date & time of generation
+IGNORE_RULES = ['#']
+# Artifacts which can be gathered from the node
+ARTIFACTS = [ARTIFACT_CONFIG]
+# Config file name scheme
+CONFIG_FILE_SCHEME = '{hostname}_{version}.cfg'
+# Software version is part of the config file name
+VERSIONED_CONFIG = True
+# License check is disabled until license output of the node is verified
+LICENSE_SUPPORT = False
 
 # Path to SFTP folder on remote host
 SFTP_PATH = '/Core/home/{}/'.format(USERNAME)
-# Command that shows license information
-SHOW_LICENSE_INFORMATION_CMD = 'show license information'
 CONFIG_FILE_NAME = 'ConfigFile_from_export'
 
+@timed('save_config')
 def save_config(hostname, ip, username, password):
 	"""
 	Function that downloads current config of Cisco vEPC node
@@ -29,30 +42,37 @@ def save_config(hostname, ip, username, password):
 
 	PROMPT = '.*=== {} .*ANCB ~ #.*'.format(hostname)
 
+	ssh = interact = None
+	stopwatch = Stopwatch()
 	try:
-		ssh = paramiko.SSHClient()
-		ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-		ssh.connect(ip, username=username, password=password, timeout=30)
+		# Reuse pooled connection to the node if available
+		ssh = SSH_POOL.acquire(ip, username, password, timeout=30)
+		stopwatch.lap('connect')
 		interact = SSHClientInteraction(ssh, timeout=60, display=False)
-		interact.expect(PROMPT)
+		expect(interact, PROMPT)
+		stopwatch.lap('prompt')
 		# Check node software version
 		interact.send('gsh get_ne')
-		interact.expect(PROMPT)
+		expect(interact, PROMPT)
+		stopwatch.lap('version')
 		version = interact.current_output_clean.split('\n')
 		# Put node version into file name
 		for line in version:
 			if ('SoftwareLevel') in line:
-				file_name = '{}_{}.cfg'.format(hostname, line.split()[2].split('(')[1][:-1])
+				file_name = CONFIG_FILE_SCHEME.format(hostname=hostname, version=line.split()[2].split('(')[1][:-1])
 		# Save node config in path /sftp/<file_name>
 		interact.send('gsh export_config_active')
-		interact.expect(PROMPT)
+		expect(interact, PROMPT)
+		stopwatch.lap('export')
 		# Open SFTP conneciton to download config file
 		sftp = ssh.open_sftp()
 		sftp.get(SFTP_PATH + CONFIG_FILE_NAME, TMP_PATH + file_name)
 		sftp.close()
+		stopwatch.lap('download')
 		# Delete config file to free up space
 		interact.send('rm ' + CONFIG_FILE_NAME)
-		interact.expect(PROMPT)
+		expect(interact, PROMPT)
+		stopwatch.lap('cleanup')
 	
 	except Exception as e:
 		# Any exception is logged to file with current date
@@ -60,12 +80,19 @@ def save_config(hostname, ip, username, password):
 		log = DATE + ' : ' + str(e)
 		with open(GIT_PATH + hostname + '/' + file_name, 'a') as f:
 			f.write(log + '\n')
+		record_change(GIT_PATH + hostname + '/' + file_name)
+		record_error(hostname, e)
 	
 	finally:
-		ssh.close()
+		# Close only the interactive channel and return connection to the pool
+		if interact is not None:
+			interact.close()
+		if ssh is not None:
+			SSH_POOL.release(ssh)
 
 	return file_name
 
+@timed('compare')
 def compare_configs(hostname, config_name, old_config_name):
 	"""
 	Funciton that compare given config file with one stored in git repo.
@@ -77,27 +104,6 @@ def compare_configs(hostname, config_name, old_config_name):
 		old_config_name: config file name stored in git repo
 	
 	Return:
-		None
+		CONFIG_SAME, CONFIG_CHANGED or CONFIG_ADDED
 	"""
-	new_config = TMP_PATH + config_name
-	old_config_path = GIT_PATH + hostname + '/'
-	# If config file names are the same (e.g. same SW version) then compare configs
-	if (config_name == old_config_name):
-		# Compare configs and ommits lines with comments - flag "-I #"
-		# Everytime a config file is generated it is saved with date & time of generation
-		diff_results = subprocess.run(['diff', '-u', '-I', '#', new_config, old_config_path + old_config_name], stdout=subprocess.PIPE)
-		if diff_results.returncode == 0:
-			# If configs are the same then remove downloaded config file
-			print(COMPARE_CONFIG_IGNORE)
-			subprocess.run(['rm', new_config], stdout=subprocess.PIPE)
-		else:
-			# If configs differs then move downloaded file to git repo
-			print(COMPARE_CONFIG_REPLACE)
-			subprocess.run(['mv', new_config, old_config_path], stdout=subprocess.PIPE)
-	# If config file names differs (e.g. different SW version) then move downloaded file to git repo
-	else:
-		print(COMPARE_CONFIG_ADD)
-		subprocess.run(['mv', new_config, old_config_path], stdout=subprocess.PIPE)
-
-def validate_license(hostname, license):
-	pass
\ No newline at end of file
+	return compare_and_store(TMP_PATH + config_name, GIT_PATH + hostname + '/', old_config_name, IGNORE_RULES)
\ No newline at end of file
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+import re
+import codecs
+import functools
+
+from paramiko_expect import strip_ansi_codes
+
+# Regex matching ANSI escape sequences sent by the node's CLI
+ANSI_ESCAPE = re.compile(r'\x1b\[[0-?]*[ -/]*[@-~]|\x1b[@-Z\\-_]')
+# Regex matching beginning of ANSI escape sequence not received completely yet
+ANSI_PARTIAL = re.compile(r'\x1b(\[[0-?]*[ -/]*)?')
+# Longest ANSI escape sequence held back when split between two chunks
+ANSI_MAX_LENGTH = 32
+# Number of trailing characters of unfinished line kept for prompt matching
+TAIL_WINDOW = 4096
+
+
+@functools.lru_cache(maxsize=None)
+def compile_prompt(prompt):
+	"""
+	Function that compiles prompt regex once per vendor prompt. Prompts in format
+	'.*{hostname}#.*' are searched for without leading and trailing '.*',
+	so the regex engine does not backtrack over the whole line. Other prompts
+	have to end at the end of the line like in SSHClientInteraction.expect()
+
+	Args:
+		prompt:	regex of the prompt as used by vendor modules
+
+	Returns:
+		function returning match object if the prompt matches given text
+	"""
+	core = prompt
+	while core.startswith('.*'):
+		core = core[2:]
+	while core.endswith('.*') and not core.endswith('\\.*'):
+		core = core[:-2]
+	if not prompt.endswith('.*') or prompt.endswith('\\.*'):
+		core += r'\Z'
+	pattern = re.compile(core, re.DOTALL)
+	# Prompt without leading '.*' has to start at the beginning of the line
+	return pattern.search if prompt.startswith('.*') else pattern.match
+
+
+class AnsiStripper:
+	"""
+	Removes ANSI escape sequences from output received in chunks. Sequence
+	split between two chunks is held back until its end is received
+	"""
+
+	def __init__(self):
+		self.carry = ''
+
+	def feed(self, text):
+		"""Return text of the chunk without ANSI escape sequences"""
+		text = self.carry + text
+		self.carry = ''
+		escape = text.rfind('\x1b', max(0, len(text) - ANSI_MAX_LENGTH))
+		if escape >= 0 and not ANSI_ESCAPE.match(text, escape) and ANSI_PARTIAL.fullmatch(text, escape):
+			self.carry = text[escape:]
+			text = text[:escape]
+		return ANSI_ESCAPE.sub('', text)
+
+
+class PromptMatcher:
+	"""
+	Incremental prompt matcher for expect sessions. Received output is cleaned
+	of '\\r' and ANSI sequences once and only the tail of the last unfinished
+	line (prompt never ends with new line) is matched, so CPU time of the session
+	grows linearly with the output size instead of rescanning the whole output
+
+	Attributes:
+		prompts:	list of prompt regexes in the same format as used by vendor modules
+		line:		clean tail of the last unfinished line
+	"""
+
+	def __init__(self, prompts, window=TAIL_WINDOW):
+		self.prompts = [prompts] if isinstance(prompts, str) else list(prompts)
+		self.matchers = [compile_prompt(prompt) for prompt in self.prompts]
+		self.window = window
+		self.stripper = AnsiStripper()
+		self.line = ''
+
+	def feed(self, text):
+		"""
+		Function that adds decoded output of the node to the matcher
+
+		Args:
+			text:	decoded chunk of the output
+
+		Returns:
+			chunk without '\\r' and ANSI escape sequences
+		"""
+		clean = self.stripper.feed(text.replace('\r', ''))
+		newline = clean.rfind('\n')
+		if newline >= 0:
+			self.line = clean[newline + 1:]
+		else:
+			self.line += clean
+		if len(self.line) > self.window:
+			self.line = self.line[-self.window:]
+		return clean
+
+	def match(self):
+		"""Return index of the first prompt matching the last unfinished line or None"""
+		for index, matcher in enumerate(self.matchers):
+			if matcher(self.line):
+				return index
+		return None
+
+
+def expect(interact, prompts, timeout=None):
+	"""
+	Function that waits for one of the prompts like SSHClientInteraction.expect(),
+	but every received chunk is cleaned once and prompts are matched against
+	the tail of the last line only instead of rescanning the whole output.
+	Sets current_output, current_output_clean and last_match of the interaction
+	the same way as SSHClientInteraction.expect()
+
+	Args:
+		interact:	SSHClientInteraction of the session
+		prompts:	regex or list of regexes of the prompts (e.g. '.*{hostname}#.*')
+		timeout:	time limit in seconds for receiving next chunk of output,
+					timeout of the interaction is used if not set
+
+	Returns:
+		index of the matched prompt in the list (0 for single prompt)
+	"""
+	matcher = PromptMatcher(prompts)
+	# Decoding errors are ignored like in SSHClientInteraction.expect()
+	decoder = codecs.getincrementaldecoder(interact.encoding)('ignore')
+	interact.channel.settimeout(timeout or interact.timeout)
+	chunks = []
+	index = None
+	while index is None:
+		data = interact.channel.recv(interact.buffer_size)
+		if not data:
+			raise ConnectionError('Connection closed while waiting for ' + ' or '.join(matcher.prompts))
+		text = strip_ansi_codes(decoder.decode(data).replace('\r', ''))
+		matcher.feed(text)
+		chunks.append(text)
+		index = matcher.match()
+	output = ''.join(chunks)
+	interact.current_output = output
+	if interact.current_send_string:
+		output = output.replace(interact.current_send_string + interact.newline, '')
+	interact.current_send_string = ''
+	# Prompt is removed from the last line only, it never spans more lines
+	prompt = matcher.prompts[index]
+	newline = output.rfind('\n') + 1
+	interact.current_output_clean = output[:newline] + re.sub(prompt + '$', '', output[newline:])
+	interact.last_match = prompt
+	return index
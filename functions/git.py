@@ -1,10 +1,23 @@
 #!/usr/bin/env python3
+import os
+import time
 import subprocess
 
-from functions.variables import DATE
+from functions.metrics import timed
+from functions.variables import DATE, INDENT
 
-# Path to git repository in container
-GIT_PATH = '/git/config'
+# Path to git repository in container - shards running on the same host need own clone each
+GIT_PATH = os.environ.get('PHOENIX_GIT_PATH', '/git/config/')
+# Remote repository cloned by git_bootstrap() when GIT_PATH is empty
+GIT_REMOTE_URL = 'git@gitlab.local:CHANGE_ME/config.git'
+# Number of commits fetched on clone - 0 for full history
+CLONE_DEPTH = 1
+# Minimal time in seconds between two repository maintenance runs
+MAINTENANCE_INTERVAL = 24 * 3600
+# Number of packs of partial clone consolidated into one by the next maintenance
+MAINTENANCE_MAX_PACKS = 8
+# File marking the last repository maintenance - kept inside .git folder
+MAINTENANCE_STAMP = GIT_PATH + '.git/phoenix-maintenance'
 # Commit message
 DAILY_TAG_MESSAGE = 'Configuration of lab nodes from ' + DATE
 
@@ -13,10 +26,45 @@ def git_set_global_settings():
 	subprocess.call(['git', 'config', '--global', 'user.email', 'kube-bot@kubernetes.local'])
 	subprocess.call(['git', 'config', '--global', 'user.name', 'KubeBot'])
 
+@timed('git_bootstrap')
+def git_bootstrap(remote_url=GIT_REMOTE_URL, directories=None, depth=CLONE_DEPTH):
+	"""
+	Function that prepares git repository in GIT_PATH for the backup pod.
+	Missing repository is cloned shallow (depth) and partial (blob:none)
+	without tags, so only the latest tree and blobs of checked out files
+	are downloaded. When directories are given the working tree is limited
+	to them with sparse checkout - repository files outside of the current
+	inventory are not written to the volume
+
+	Args:
+		remote_url:		URL of remote repository (default GIT_REMOTE_URL)
+		directories:	list of directories to check out e.g. hostnames
+						of the inventory (default whole repository)
+		depth:			number of commits to fetch, 0 for full history (default CLONE_DEPTH)
+
+	Returns:
+		True if repository was cloned otherwise False
+	"""
+	cloned = False
+	if not os.path.isdir(GIT_PATH + '.git'):
+		clone = ['git', 'clone', '--no-checkout', '--no-tags', '--filter=blob:none']
+		if depth:
+			clone += ['--depth', str(depth)]
+		subprocess.run(clone + [remote_url, GIT_PATH], check=True)
+		cloned = True
+	# Sparse checkout is updated on every start as inventory may change
+	if directories is not None:
+		subprocess.run(['git', '-C', GIT_PATH, 'sparse-checkout', 'set', '--cone'] + sorted(directories), check=True)
+	if cloned:
+		subprocess.run(['git', '-C', GIT_PATH, 'checkout'], check=True)
+	return cloned
+
+@timed('git_pull')
 def git_pull():
-	"""Fetch files from remote repository"""
-	subprocess.call(['git', '-C', GIT_PATH, 'pull'])
+	"""Fetch files from remote repository, failed pull raises CalledProcessError"""
+	subprocess.run(['git', '-C', GIT_PATH, 'pull'], check=True)
 
+@timed('git_push')
 def git_push(follow_tags=None):
 	"""Update remote repository with associated objects"""
 	if (follow_tags == None):
@@ -24,14 +72,110 @@ def git_push(follow_tags=None):
 	else:
 		subprocess.run(['git', '-C', GIT_PATH, 'push', follow_tags])
 
-def git_add():
-	"""Add all files to the commit"""
-	subprocess.run(['git', '-C', GIT_PATH, 'add', '.'])
-
-def git_commit(message=DATE):
-	"""Record changes to git repository"""
-	subprocess.run(['git', '-C', GIT_PATH, 'commit', '-a', '-m', message])
-
+@timed('git_tag')
 def daily_tag(message=DAILY_TAG_MESSAGE, tag_name=DATE):
 	"""Set tag for the commit"""
-	subprocess.run(['git', '-C', GIT_PATH, 'tag', '-a', tag_name, '-m', message])
\ No newline at end of file
+	subprocess.run(['git', '-C', GIT_PATH, 'tag', '-a', tag_name, '-m', message])
+
+def git_output(*args, stdin=None, check=True):
+	"""Run git command in repository and return its stripped output"""
+	result = subprocess.run(['git', '-C', GIT_PATH] + list(args), input=stdin,
+		stdout=subprocess.PIPE, check=check)
+	return result.stdout.decode('utf-8').strip()
+
+@timed('git_commit')
+def git_commit_paths(paths, message=DATE, tag_name=None, tag_message=DAILY_TAG_MESSAGE):
+	"""
+	Function that commits exactly the given paths using git plumbing commands.
+	Unlike 'git add .' & 'git commit -a' the working tree is not scanned,
+	so commit time depends on number of changed files, not on repository size
+
+	Args:
+		paths:			list of paths relative to git repository
+						which were added, modified or removed
+		message:		commit message (default DATE)
+		tag_name:		name of annotated tag for the commit if any
+		tag_message:	message of the tag (default DAILY_TAG_MESSAGE)
+
+	Returns:
+		id of the new commit or None if there is nothing to commit
+	"""
+	existing = [path for path in paths if os.path.isfile(GIT_PATH + path)]
+	removed = [path for path in paths if not os.path.isfile(GIT_PATH + path)]
+	# Write blobs of all existing files with single git process
+	blobs = []
+	if existing:
+		blobs = git_output('hash-object', '-w', '--stdin-paths',
+			stdin='\n'.join(existing).encode('utf-8')).split('\n')
+	# Update index entries of given paths only - mode 0 removes the entry
+	index_info = ['100644 {}\t{}'.format(blob, path) for blob, path in zip(blobs, existing)]
+	index_info += ['0 {}\t{}'.format('0' * 40, path) for path in removed]
+	if index_info:
+		git_output('update-index', '--index-info', stdin=('\n'.join(index_info) + '\n').encode('utf-8'))
+
+	tree = git_output('write-tree')
+	parent = git_output('rev-parse', '--verify', '-q', 'HEAD', check=False)
+	if parent and tree == git_output('rev-parse', parent + '^{tree}'):
+		return None
+	parents = ['-p', parent] if parent else []
+	commit = git_output('commit-tree', tree, *parents, '-m', message)
+	# Move current branch to the new commit if nobody else moved it
+	git_output('update-ref', '-m', 'commit: ' + message, 'HEAD', commit, *([parent] if parent else []))
+	if tag_name is not None:
+		git_output('tag', '-a', tag_name, '-m', tag_message, commit)
+	return commit
+
+
+def git_object_stats():
+	"""
+	Function that reports object counts and pack sizes of the repository
+
+	Returns:
+		dictionary of 'git count-objects -v' values e.g. count (loose objects),
+		size-pack (KiB), packs and number of refs
+	"""
+	stats = {}
+	for line in git_output('count-objects', '-v').splitlines():
+		key, value = line.split(':', 1)
+		stats[key] = int(value)
+	stats['refs'] = len(git_output('for-each-ref', '--format=%(refname)').splitlines())
+	return stats
+
+@timed('git_maintenance')
+def git_maintenance(force=False, interval=MAINTENANCE_INTERVAL, max_packs=MAINTENANCE_MAX_PACKS):
+	"""
+	Function that keeps git operations fast as daily tags and configs pile up.
+	Packs refs (tags), repacks loose objects into geometric progression of packs
+	(only new objects are rewritten), updates multi-pack-index and split commit-graph.
+	Partial clones (promisor packs) are repacked without geometric progression
+	which git does not support for them - new objects get own pack and all packs
+	are consolidated once their number reaches max_packs (promisor objects are kept
+	in separate promisor pack by git). Runs only if last maintenance is older
+	than interval. Failed maintenance is logged and retried with the next run
+
+	Args:
+		force:		run maintenance regardless of the schedule (default False)
+		interval:	minimal time in seconds between runs (default MAINTENANCE_INTERVAL)
+		max_packs:	number of packs of partial clone consolidated into one (default MAINTENANCE_MAX_PACKS)
+
+	Returns:
+		dictionary of repository object stats after maintenance or None if not due or failed
+	"""
+	if not force and os.path.exists(MAINTENANCE_STAMP) and time.time() - os.path.getmtime(MAINTENANCE_STAMP) < interval:
+		return None
+	try:
+		git_output('pack-refs', '--all', '--prune')
+		if git_output('config', '--get', 'remote.origin.promisor', check=False) != 'true':
+			git_output('repack', '-d', '-l', '--geometric=2', '--write-midx')
+		elif git_object_stats()['packs'] >= max_packs:
+			git_output('repack', '-a', '-d', '-l', '--write-midx')
+		else:
+			git_output('repack', '-d', '-l', '--write-midx')
+		git_output('prune-packed')
+		git_output('commit-graph', 'write', '--reachable', '--split')
+		with open(MAINTENANCE_STAMP, 'w') as f:
+			f.write(time.ctime() + '\n')
+		return git_object_stats()
+	except (subprocess.CalledProcessError, OSError) as e:
+		print(INDENT + 'ERROR Repository maintenance failed: {}'.format(e))
+		return None
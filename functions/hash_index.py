@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+import os
+import json
+import fnmatch
+import threading
+import subprocess
+
+from functions.git import GIT_PATH
+
+# Index file kept inside .git folder so it is never commited to the repository
+INDEX_PATH = GIT_PATH + '.git/phoenix-hash-index.json'
+
+# Index entries - relative path in git repo: {
+# 	'blob':		git blob id of the file at last refresh
+# 	'size':		file size when digests were calculated
+# 	'mtime':	file modification time (ns) when digests were calculated
+# 	'digests':	ignore rules key: normalized content digest
+# }
+_entries = None
+# Lock protecting index entries used by concurrent backup jobs
+_lock = threading.Lock()
+
+
+def rules_key(ignore):
+	"""Return index key for given list of ignore rules"""
+	return '\n'.join(sorted(ignore))
+
+def repo_path(file_path):
+	"""Return path relative to git repo or None if file is outside of git repo"""
+	path = os.path.relpath(file_path, GIT_PATH)
+	if path.startswith('..'):
+		return None
+	return path
+
+def load_index():
+	"""
+	Function that loads hash index from disk if not loaded yet
+
+	Returns:
+		dictionary of index entries
+	"""
+	global _entries
+	with _lock:
+		if _entries is None:
+			try:
+				with open(INDEX_PATH, 'r') as f:
+					_entries = json.load(f)
+			except (OSError, ValueError):
+				_entries = {}
+		return _entries
+
+def save_index():
+	"""Write hash index to disk"""
+	entries = load_index()
+	with _lock:
+		tmp_file = INDEX_PATH + '.tmp'
+		with open(tmp_file, 'w') as f:
+			json.dump(entries, f)
+		os.replace(tmp_file, INDEX_PATH)
+
+def refresh_index():
+	"""
+	Function that updates hash index with files tracked by git repository.
+	Should be called after git_pull(). Only entries of files whose git blob
+	changed lose their digests, so no file content is read here
+
+	Returns:
+		number of entries invalidated or added
+	"""
+	entries = load_index()
+	output = subprocess.run(['git', '-C', GIT_PATH, 'ls-files', '-s', '-z'],
+		stdout=subprocess.PIPE).stdout.decode('utf-8')
+	tracked = {}
+	for record in output.split('\0'):
+		if record:
+			# Record format: <mode> <blob> <stage>\t<path>
+			info, path = record.split('\t', 1)
+			tracked[path] = info.split()[1]
+
+	changed = 0
+	with _lock:
+		for path, blob in tracked.items():
+			entry = entries.get(path)
+			if entry is None or entry.get('blob') != blob:
+				entries[path] = {'blob': blob, 'digests': {}}
+				changed += 1
+		# Files removed from repository are removed from the index
+		for path in [path for path in entries if path not in tracked and not os.path.exists(GIT_PATH + path)]:
+			del entries[path]
+			changed += 1
+	return changed
+
+def get_digest(file_path, ignore=()):
+	"""
+	Function that returns digest of the file stored in git repo from index
+
+	Args:
+		file_path:	path to the file in git repo
+		ignore:		list of strings marking lines to skip
+
+	Returns:
+		normalized content digest or None if not indexed or file changed since
+	"""
+	path = repo_path(file_path)
+	if path is None:
+		return None
+	entries = load_index()
+	with _lock:
+		entry = entries.get(path)
+		if entry is None or rules_key(ignore) not in entry['digests']:
+			return None
+		try:
+			stat = os.stat(file_path)
+		except FileNotFoundError:
+			return None
+		if entry.get('size') != stat.st_size or entry.get('mtime') != stat.st_mtime_ns:
+			return None
+		return entry['digests'][rules_key(ignore)]
+
+def set_digest(file_path, digest, ignore=()):
+	"""
+	Function that stores digest of the file in git repo to index
+
+	Args:
+		file_path:	path to the file in git repo
+		digest:		normalized content digest
+		ignore:		list of strings marking lines skipped in digest
+
+	Returns:
+		None
+	"""
+	path = repo_path(file_path)
+	if path is None:
+		return
+	stat = os.stat(file_path)
+	entries = load_index()
+	with _lock:
+		entry = entries.setdefault(path, {'blob': None, 'digests': {}})
+		# Digests calculated for previous file content are not valid anymore
+		if entry.get('size') != stat.st_size or entry.get('mtime') != stat.st_mtime_ns:
+			entry['digests'] = {}
+		entry['size'] = stat.st_size
+		entry['mtime'] = stat.st_mtime_ns
+		entry['digests'][rules_key(ignore)] = digest
+
+def host_files(hostname, pattern='*'):
+	"""
+	Function that lists indexed files of the host without scanning the filesystem
+
+	Args:
+		hostname:	node's hostname
+		pattern:	pattern for search if any (default '*')
+
+	Returns:
+		list of file names in host's folder which match the pattern
+	"""
+	prefix = hostname + '/'
+	entries = load_index()
+	with _lock:
+		names = [path[len(prefix):] for path in entries if path.startswith(prefix)]
+	return [name for name in names if '/' not in name and fnmatch.fnmatch(name, pattern)]
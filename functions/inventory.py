@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+import os
+import csv
+import sqlite3
+import hashlib
+from collections import namedtuple
+
+from functions.registry import NODE_TYPES
+from functions.variables import CONFIG_NODES, dns
+
+# Node of the inventory
+# 	hostname:	node's hostname - name of its folder in git repository
+# 	ip:			IP address or DNS name the node is reached on
+# 	node_type:	node type name in NODE_TYPES (e.g. 'vepc')
+# 	site:		site the node is located at, '' if not known
+# 	tags:		tuple of free form tags (e.g. ('lab', 'core'))
+Node = namedtuple('Node', ['hostname', 'ip', 'node_type', 'site', 'tags'])
+
+# Columns of CSV file & SQLite table - tags are separated by spaces
+INVENTORY_COLUMNS = ['hostname', 'ip', 'type', 'site', 'tags']
+# SQLite table with the nodes
+INVENTORY_TABLE = 'nodes'
+
+
+def make_node(record):
+	"""
+	Function that creates Node from inventory record
+
+	Args:
+		record:	dictionary with hostname, ip, type and optional site & tags
+
+	Returns:
+		Node
+	"""
+	for column in ['hostname', 'ip', 'type']:
+		if not record.get(column):
+			raise ValueError('Inventory record without {}: {}'.format(column, record))
+	if record['type'] not in NODE_TYPES:
+		raise ValueError('Unknown node type {} of {} - known types: {}'.format(
+			record['type'], record['hostname'], ', '.join(sorted(NODE_TYPES))))
+	tags = record.get('tags') or ()
+	if isinstance(tags, str):
+		tags = tags.split()
+	return Node(str(record['hostname']), str(record['ip']), record['type'], str(record.get('site') or ''), tuple(tags))
+
+def read_yaml(path):
+	"""Return records of YAML inventory - list of nodes or mapping with 'nodes' list"""
+	try:
+		import yaml
+	except ImportError:
+		raise ImportError('PyYAML is required for YAML inventory {} - use CSV or SQLite inventory instead'.format(path))
+	with open(path, 'r') as f:
+		data = yaml.safe_load(f) or []
+	if isinstance(data, dict):
+		data = data.get('nodes') or []
+	return data
+
+def read_csv(path):
+	"""Return records of CSV inventory with header of INVENTORY_COLUMNS"""
+	with open(path, 'r', newline='') as f:
+		return list(csv.DictReader(f))
+
+def read_sqlite(path):
+	"""Return records of INVENTORY_TABLE in SQLite inventory"""
+	connection = sqlite3.connect('file:{}?mode=ro'.format(path), uri=True)
+	try:
+		connection.row_factory = sqlite3.Row
+		rows = connection.execute('SELECT {} FROM {}'.format(', '.join(INVENTORY_COLUMNS), INVENTORY_TABLE))
+		return [dict(row) for row in rows]
+	finally:
+		connection.close()
+
+# File extension: reader of the inventory file
+READERS = {
+	'.yaml': read_yaml,
+	'.yml': read_yaml,
+	'.csv': read_csv,
+	'.sqlite': read_sqlite,
+	'.sqlite3': read_sqlite,
+	'.db': read_sqlite,
+}
+
+
+def default_inventory():
+	"""Return nodes of the dictionaries in variables.py"""
+	nodes = []
+	for node_type, hosts in CONFIG_NODES + [('dns', dns)]:
+		for hostname, ip in hosts.items():
+			nodes.append(Node(hostname, ip, node_type, '', ()))
+	return nodes
+
+def load_inventory(path=None):
+	"""
+	Function that loads nodes from inventory file. Format is selected by file extension
+
+	Args:
+		path:	path to .yaml, .csv or .sqlite inventory,
+				None or '' for dictionaries in variables.py
+
+	Returns:
+		list of Node sorted by hostname
+	"""
+	if not path:
+		nodes = default_inventory()
+	else:
+		extension = os.path.splitext(path)[1].lower()
+		if extension not in READERS:
+			raise ValueError('Unknown inventory format {} - supported: {}'.format(path, ', '.join(sorted(READERS))))
+		nodes = [make_node(record) for record in READERS[extension](path)]
+	hostnames = set()
+	for node in nodes:
+		if node.hostname in hostnames:
+			raise ValueError('Duplicate hostname {} in inventory'.format(node.hostname))
+		hostnames.add(node.hostname)
+	return sorted(nodes, key=lambda node: node.hostname)
+
+def select_nodes(nodes, node_types=None, sites=None, tags=None):
+	"""
+	Function that filters nodes of the inventory
+
+	Args:
+		nodes:		list of Node
+		node_types:	node type names to keep (default all)
+		sites:		sites to keep (default all)
+		tags:		tags the node must have at least one of (default all)
+
+	Returns:
+		list of Node matching all given filters
+	"""
+	return [node for node in nodes
+		if (node_types is None or node.node_type in node_types)
+		and (sites is None or node.site in sites)
+		and (tags is None or set(node.tags) & set(tags))]
+
+def shard_of(hostname, count):
+	"""
+	Return shard of the host. Hash of the hostname is stable across processes
+	and runs, so adding a node to the inventory does not move other nodes
+	"""
+	digest = hashlib.sha1(hostname.encode('utf-8')).digest()
+	return int.from_bytes(digest[:8], 'big') % count
+
+def shard_nodes(nodes, index=0, count=1):
+	"""
+	Function that returns deterministic slice of the inventory processed by one shard
+
+	Args:
+		nodes:	list of Node
+		index:	shard index from 0 to count - 1 (default 0)
+		count:	number of shards (default 1)
+
+	Returns:
+		list of Node of the shard
+	"""
+	if count < 1 or not 0 <= index < count:
+		raise ValueError('Invalid shard {} of {}'.format(index, count))
+	if count == 1:
+		return list(nodes)
+	return [node for node in nodes if shard_of(node.hostname, count) == index]
+
+def hosts_by_type(nodes):
+	"""
+	Function that groups nodes by node type in NODE_TYPES order
+
+	Args:
+		nodes:	list of Node
+
+	Returns:
+		list of (node type name, dictionary of HOSTNAME:IP_ADDR) for types with any node
+	"""
+	groups = {name: {} for name in NODE_TYPES}
+	for node in nodes:
+		groups[node.node_type][node.hostname] = node.ip
+	return [(name, hosts) for name, hosts in groups.items() if hosts]
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+import os
+import re
+import json
+import datetime
+from collections import namedtuple
+
+from functions.variables import TMP_PATH, TODAY, LICENSE_EXTENSION, LICENSE_ALERT_DAYS, LICENSE_CACHE_PATH, LICENSE_CACHE_MAX_AGE, LICENSE_REFRESH_AHEAD
+
+# License expire information of a single node
+# 	hostname:		node's hostname
+# 	expire_date:	date when the license expires
+# 	days_left:		number of days till the license expires
+# 	license_file:	name of the license file in TMP_PATH to attach to the mail
+# 					or None if license does not expire soon
+LicenseRecord = namedtuple('LicenseRecord', ['hostname', 'expire_date', 'days_left', 'license_file'])
+
+# Vendor specific license output parser
+# 	pattern:		compiled regex matching license expire date with named
+# 					groups day, month and year
+# 	date_format:	strptime format of 'day month year' string built from the groups
+LicenseParser = namedtuple('LicenseParser', ['pattern', 'date_format'])
+
+# HTML table row of a single node in notification mail
+TABLE_ROW = '<tr><td>{}</td><td>{}</td><td>{}</td></tr>'
+
+
+def license_parser(pattern, date_format):
+	"""Return LicenseParser with pattern compiled once for multi-line license output"""
+	return LicenseParser(re.compile(pattern, re.MULTILINE), date_format)
+
+def expire_dates(license, parser):
+	"""
+	Function that finds all license expire dates in license output
+	with single pass of the vendor's parser pattern. Matches which are not
+	a valid date (e.g. 'Grace Expire none') are skipped
+
+	Args:
+		license:	node's license output in utf-8 format
+		parser:		vendor's LicenseParser
+
+	Returns:
+		list of expire dates
+	"""
+	dates = []
+	for match in parser.pattern.finditer(license):
+		date_string = ' '.join(match.group('day', 'month', 'year'))
+		try:
+			dates.append(datetime.datetime.strptime(date_string, parser.date_format).date())
+		except ValueError:
+			continue
+	return dates
+
+def earliest_expire_date(license, parser):
+	"""Return the earliest license expire date in license output or None if not found"""
+	return min(expire_dates(license, parser), default=None)
+
+def save_expiring_license(hostname, license, expire_date):
+	"""
+	Function that saves license output to file if license expires
+	within LICENSE_ALERT_DAYS, the file is attached to notification mail
+
+	Args:
+		hostname:		node's hostname
+		license:		node's license output in utf-8 format
+		expire_date:	the earliest license expire date or None
+
+	Returns:
+		name of the license file or None if license does not expire soon
+	"""
+	if expire_date is None or (expire_date - TODAY).days > LICENSE_ALERT_DAYS:
+		return None
+	license_name = hostname + LICENSE_EXTENSION
+	# Save current node license to file
+	with open(TMP_PATH + license_name, 'w+') as f:
+		f.write(license)
+	return license_name
+
+def expiring(records):
+	"""Return records of the licenses which expire soon"""
+	return [record for record in records if record.license_file is not None]
+
+def render_table(records):
+	"""
+	Function that renders license records as rows of HTML table
+	for the notification mail
+
+	Args:
+		records:	list of LicenseRecord
+
+	Returns:
+		HTML table rows ordered by days left
+	"""
+	rows = [TABLE_ROW.format(record.hostname, record.expire_date, record.days_left)
+		for record in sorted(records, key=lambda record: record.days_left)]
+	return ''.join(rows)
+
+def load_license_cache(path=LICENSE_CACHE_PATH):
+	"""
+	Function that loads license cache from disk
+
+	Args:
+		path:	path to cache file (default LICENSE_CACHE_PATH)
+
+	Returns:
+		dictionary of HOSTNAME:{expire_date, checked, license} or empty dictionary
+	"""
+	try:
+		with open(path, 'r') as f:
+			return json.load(f)
+	except (OSError, ValueError):
+		return {}
+
+def save_license_cache(cache, path=LICENSE_CACHE_PATH):
+	"""Write license cache to disk"""
+	tmp_file = path + '.tmp'
+	with open(tmp_file, 'w') as f:
+		json.dump(cache, f, indent=1)
+	os.replace(tmp_file, path)
+
+def update_license_cache(cache, hostname, expire_date, license):
+	"""Store license checked today in the cache"""
+	cache[hostname] = {
+		'expire_date': expire_date.isoformat(),
+		'checked': TODAY.isoformat(),
+		'license': license,
+	}
+
+def needs_refresh(entry):
+	"""
+	Function that decides if node's license has to be checked on the node again.
+	License is checked if cached entry is older than LICENSE_CACHE_MAX_AGE days
+	or if it expires within LICENSE_REFRESH_AHEAD days before alert window
+
+	Args:
+		entry:	cached license entry of the node
+
+	Returns:
+		True if license should be checked on the node otherwise False
+	"""
+	expire_date = datetime.date.fromisoformat(entry['expire_date'])
+	checked = datetime.date.fromisoformat(entry['checked'])
+	if (TODAY - checked).days >= LICENSE_CACHE_MAX_AGE:
+		return True
+	return (expire_date - TODAY).days <= LICENSE_ALERT_DAYS + LICENSE_REFRESH_AHEAD
+
+def cached_record(hostname, entry):
+	"""Return LicenseRecord of the node from cached entry"""
+	expire_date = datetime.date.fromisoformat(entry['expire_date'])
+	return LicenseRecord(hostname, expire_date, (expire_date - TODAY).days, None)
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+import os
+import json
+import time
+import datetime
+import functools
+import threading
+import contextvars
+import contextlib
+
+from functions.variables import INDENT, METRICS_JSON_PATH, METRICS_PROM_PATH, METRICS_PREFIX
+
+# Host the current job works on - set per thread by run_on_hosts()
+_current_host = contextvars.ContextVar('metrics_host', default=None)
+# HOSTNAME or None for run level steps (e.g. git): {phase: [seconds, count]}
+_phases = {}
+# HOSTNAME: (status, duration, error) of the host's job
+_hosts = {}
+# Lock protecting metrics recorded by concurrent jobs
+_lock = threading.Lock()
+# Wall clock and monotonic time of the run start
+_started = (time.time(), time.monotonic())
+
+
+@contextlib.contextmanager
+def host_context(hostname):
+	"""Context manager attributing phases recorded inside it to given host"""
+	token = _current_host.set(hostname)
+	try:
+		yield
+	finally:
+		_current_host.reset(token)
+
+def record_phase(name, seconds, hostname=None):
+	"""
+	Function that adds duration of the phase to the host's metrics.
+	Repeated phases (e.g. several SFTP downloads) are summed up
+
+	Args:
+		name:		phase name (e.g. 'connect', 'download', 'git_pull')
+		seconds:	duration of the phase
+		hostname:	node's hostname (default host of the current job)
+
+	Returns:
+		None
+	"""
+	if hostname is None:
+		hostname = _current_host.get()
+	with _lock:
+		phase = _phases.setdefault(hostname, {}).setdefault(name, [0.0, 0])
+		phase[0] += seconds
+		phase[1] += 1
+
+def record_host(result):
+	"""Record status and duration of the host's job from HostResult"""
+	with _lock:
+		_hosts[result.hostname] = (result.status, result.duration, result.error)
+
+def import_hosts(report):
+	"""
+	Function that adds hosts of the report written by another process
+	(e.g. shard pod) to the metrics of this run
+
+	Args:
+		report:	dictionary returned by run_report() of the other process
+
+	Returns:
+		None
+	"""
+	with _lock:
+		for hostname, host in report['hosts'].items():
+			if host['status'] is not None:
+				_hosts[hostname] = (host['status'], host['duration'], host['error'])
+			for name, value in host['phases'].items():
+				phase = _phases.setdefault(hostname, {}).setdefault(name, [0.0, 0])
+				phase[0] += value['seconds']
+				phase[1] += value['count']
+
+@contextlib.contextmanager
+def phase(name):
+	"""Context manager measuring duration of the phase, failed phases are measured too"""
+	start = time.monotonic()
+	try:
+		yield
+	finally:
+		record_phase(name, time.monotonic() - start)
+
+def timed(name):
+	"""
+	Decorator measuring every call of the function as the phase of the current host
+
+	Args:
+		name:	phase name
+
+	Returns:
+		decorator
+	"""
+	def decorator(function):
+		@functools.wraps(function)
+		def wrapper(*args, **kwargs):
+			with phase(name):
+				return function(*args, **kwargs)
+		return wrapper
+	return decorator
+
+class Stopwatch:
+	"""
+	Measures consecutive phases of a session without nesting the code,
+	every lap records time passed since the previous lap.
+	E.g. lap('connect') after login, lap('version') after 'show version'
+	"""
+
+	def __init__(self):
+		self.last = time.monotonic()
+
+	def lap(self, name):
+		"""Record time since the previous lap as the phase and start next one"""
+		now = time.monotonic()
+		record_phase(name, now - self.last)
+		self.last = now
+
+def phases_dict(phases):
+	"""Return phases as dictionary for JSON report"""
+	return {name: {'seconds': round(seconds, 3), 'count': count} for name, (seconds, count) in sorted(phases.items())}
+
+def run_report():
+	"""
+	Function that builds the run report from recorded metrics
+
+	Returns:
+		dictionary with run start, duration, run level phases and
+		status, duration and phases of every host
+	"""
+	with _lock:
+		hosts = {}
+		for hostname in sorted(set(_hosts) | {h for h in _phases if h is not None}):
+			status, duration, error = _hosts.get(hostname, (None, None, None))
+			hosts[hostname] = {
+				'status': status,
+				'duration': None if duration is None else round(duration, 3),
+				'error': error,
+				'phases': phases_dict(_phases.get(hostname, {})),
+			}
+		return {
+			'started': datetime.datetime.fromtimestamp(_started[0]).isoformat(timespec='seconds'),
+			'duration': round(time.monotonic() - _started[1], 3),
+			'phases': phases_dict(_phases.get(None, {})),
+			'hosts': hosts,
+		}
+
+def label(value):
+	"""Return Prometheus label value with escaped special characters"""
+	return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def prometheus_text(report, prefix=METRICS_PREFIX):
+	"""
+	Function that renders the run report in Prometheus textfile format
+
+	Args:
+		report:	dictionary returned by run_report()
+		prefix:	metric name prefix (default METRICS_PREFIX)
+
+	Returns:
+		report as Prometheus text exposition format
+	"""
+	lines = [
+		'# HELP {}_run_start_timestamp_seconds Start time of the last run'.format(prefix),
+		'# TYPE {}_run_start_timestamp_seconds gauge'.format(prefix),
+		'{}_run_start_timestamp_seconds {}'.format(prefix, round(_started[0])),
+		'# HELP {}_run_duration_seconds Duration of the last run'.format(prefix),
+		'# TYPE {}_run_duration_seconds gauge'.format(prefix),
+		'{}_run_duration_seconds {}'.format(prefix, report['duration']),
+		'# HELP {}_phase_seconds Time spent in the phase outside of host jobs'.format(prefix),
+		'# TYPE {}_phase_seconds gauge'.format(prefix),
+	]
+	for name, value in report['phases'].items():
+		lines.append('{}_phase_seconds{{phase="{}"}} {}'.format(prefix, label(name), value['seconds']))
+	lines += [
+		'# HELP {}_host_duration_seconds Duration of the host job'.format(prefix),
+		'# TYPE {}_host_duration_seconds gauge'.format(prefix),
+	]
+	for hostname, host in report['hosts'].items():
+		if host['duration'] is not None:
+			lines.append('{}_host_duration_seconds{{host="{}",status="{}"}} {}'.format(
+				prefix, label(hostname), label(host['status']), host['duration']))
+	lines += [
+		'# HELP {}_host_phase_seconds Time spent by the host in the phase'.format(prefix),
+		'# TYPE {}_host_phase_seconds gauge'.format(prefix),
+	]
+	for hostname, host in report['hosts'].items():
+		for name, value in host['phases'].items():
+			lines.append('{}_host_phase_seconds{{host="{}",phase="{}"}} {}'.format(
+				prefix, label(hostname), label(name), value['seconds']))
+	return '\n'.join(lines) + '\n'
+
+def write_atomic(path, content):
+	"""Write file through temporary file so readers never see it half written"""
+	os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+	tmp_file = path + '.tmp'
+	with open(tmp_file, 'w') as f:
+		f.write(content)
+	os.replace(tmp_file, path)
+
+def write_report(json_path=METRICS_JSON_PATH, prom_path=METRICS_PROM_PATH):
+	"""
+	Function that writes the run report as JSON and Prometheus textfile.
+	Report which can not be written is logged, so it never fails the finished run
+
+	Args:
+		json_path:	path to JSON report, None or '' to skip it (default METRICS_JSON_PATH)
+		prom_path:	path to Prometheus textfile, None or '' to skip it (default METRICS_PROM_PATH)
+
+	Returns:
+		dictionary of the run report
+	"""
+	report = run_report()
+	outputs = []
+	if json_path:
+		outputs.append((json_path, json.dumps(report, indent=2)))
+	if prom_path:
+		outputs.append((prom_path, prometheus_text(report)))
+	for path, content in outputs:
+		try:
+			write_atomic(path, content)
+		except OSError as e:
+			print(INDENT + 'ERROR Unable to write run report {}: {}'.format(path, e))
+	return report
+
+def slowest(report, count=10):
+	"""
+	Function that finds hosts and host phases taking the most time
+
+	Args:
+		report:	dictionary returned by run_report()
+		count:	number of items to return (default 10)
+
+	Returns:
+		list of (HOSTNAME, duration) and list of (HOSTNAME, phase, seconds)
+	"""
+	hosts = [(hostname, host['duration']) for hostname, host in report['hosts'].items() if host['duration'] is not None]
+	phases = [(hostname, name, value['seconds'])
+		for hostname, host in report['hosts'].items() for name, value in host['phases'].items()]
+	return (sorted(hosts, key=lambda item: item[1], reverse=True)[:count],
+		sorted(phases, key=lambda item: item[2], reverse=True)[:count])
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+import time
+import asyncio
+import threading
+from collections import namedtuple
+
+from functions.metrics import record_phase, timed
+from functions.variables import SSH_PORT, PROBE_TIMEOUT, PROBE_DEADLINE, PROBE_BANNER, PROBE_CONCURRENCY
+
+# Result of the probe of a single host
+# 	hostname:	node's hostname
+# 	reachable:	True if the node accepted TCP connection (and sent SSH banner if read)
+# 	seconds:	time till the node answered or the probe gave up
+# 	banner:		SSH banner of the node (e.g. 'SSH-2.0-OpenSSH_8.0') or None
+# 	error:		reason why the node is unreachable otherwise None
+ProbeResult = namedtuple('ProbeResult', ['hostname', 'reachable', 'seconds', 'banner', 'error'])
+
+# Maximal number of lines read before SSH banner - server may send other lines first
+BANNER_LINES = 5
+
+# HOSTNAME: ProbeResult of hosts probed during the run
+_results = {}
+# Lock protecting probe results used by concurrent jobs
+_lock = threading.Lock()
+
+
+async def probe_host(hostname, ip, port=SSH_PORT, timeout=PROBE_TIMEOUT, banner=PROBE_BANNER):
+	"""
+	Function that opens TCP connection to the node's SSH port and optionally
+	waits for SSH banner. Connection is closed without logging in
+
+	Args:
+		hostname:	node's hostname
+		ip:			node's management ip address
+		port:		SSH port of the node (default SSH_PORT)
+		timeout:	time limit in seconds for connect and banner (default PROBE_TIMEOUT)
+		banner:		read SSH banner of the node (default PROBE_BANNER)
+
+	Returns:
+		ProbeResult
+	"""
+	start = time.monotonic()
+	writer = None
+	try:
+		reader, writer = await asyncio.wait_for(asyncio.open_connection(ip, port), timeout)
+		text = None
+		if banner:
+			remaining = timeout - (time.monotonic() - start)
+			for _ in range(BANNER_LINES):
+				line = await asyncio.wait_for(reader.readline(), max(0, remaining))
+				if not line:
+					break
+				if line.startswith(b'SSH-'):
+					text = line.decode('utf-8', 'replace').strip()
+					break
+			if text is None:
+				return ProbeResult(hostname, False, time.monotonic() - start, None, 'No SSH banner on port {}'.format(port))
+		return ProbeResult(hostname, True, time.monotonic() - start, text, None)
+	except asyncio.TimeoutError:
+		return ProbeResult(hostname, False, time.monotonic() - start, None, 'No answer on port {} in {} s'.format(port, timeout))
+	except OSError as e:
+		return ProbeResult(hostname, False, time.monotonic() - start, None, 'Port {}: {}'.format(port, e.strerror or e))
+	finally:
+		if writer is not None:
+			writer.close()
+
+@timed('probe')
+def probe_hosts(hosts, port=SSH_PORT, timeout=PROBE_TIMEOUT, deadline=PROBE_DEADLINE, banner=PROBE_BANNER, concurrency=PROBE_CONCURRENCY):
+	"""
+	Function that probes SSH port of all given hosts in single sweep.
+	Results are kept for the run, so later jobs schedule only reachable hosts
+
+	Args:
+		hosts:			dictionary of the nodes containing HOSTNAME:IP_ADDR
+		port:			SSH port of the nodes (default SSH_PORT)
+		timeout:		time limit in seconds for a single host (default PROBE_TIMEOUT)
+		deadline:		time limit in seconds for all hosts (default PROBE_DEADLINE)
+		banner:			read SSH banner of the nodes (default PROBE_BANNER)
+		concurrency:	number of hosts probed at the same time (default PROBE_CONCURRENCY)
+
+	Returns:
+		dictionary of HOSTNAME:ProbeResult
+	"""
+	async def sweep():
+		semaphore = asyncio.Semaphore(concurrency)
+
+		async def probe(hostname, ip):
+			async with semaphore:
+				return await probe_host(hostname, ip, port, timeout, banner)
+
+		tasks = {asyncio.ensure_future(probe(hostname, ip)): hostname for hostname, ip in hosts.items()}
+		if not tasks:
+			return {}
+		done, pending = await asyncio.wait(tasks, timeout=deadline)
+		for task in pending:
+			task.cancel()
+		results = {tasks[task]: task.result() for task in done}
+		for task in pending:
+			results[tasks[task]] = ProbeResult(tasks[task], False, deadline, None, 'Probe deadline exceeded')
+		return results
+
+	results = asyncio.run(sweep())
+	with _lock:
+		_results.update(results)
+	for hostname, result in results.items():
+		record_phase('probe', result.seconds, hostname)
+	return results
+
+def unreachable_hosts(hosts, port=SSH_PORT):
+	"""
+	Function that returns hosts found unreachable by probe. Hosts not probed
+	during the run yet are probed in single sweep first
+
+	Args:
+		hosts:	dictionary of the nodes containing HOSTNAME:IP_ADDR
+		port:	SSH port of the nodes (default SSH_PORT)
+
+	Returns:
+		dictionary of HOSTNAME:ProbeResult of unreachable hosts
+	"""
+	with _lock:
+		missing = {hostname: ip for hostname, ip in hosts.items() if hostname not in _results}
+	if missing:
+		probe_hosts(missing, port)
+	with _lock:
+		return {hostname: _results[hostname] for hostname in hosts if not _results[hostname].reachable}
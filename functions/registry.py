@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+import re
+import importlib
+from collections import namedtuple
+
+from functions.variables import ARTIFACT_CONFIG
+
+# Node type known to the scripts - module is imported only when its hosts are processed
+# 	module:			module implementing save_config, compare_configs, etc.
+# 	description:	name of the node type printed in logs
+NodeType = namedtuple('NodeType', ['module', 'description'])
+
+# Capabilities declared by the node type module
+# 	name:				node type name in NODE_TYPES
+# 	config_file:		config file name scheme e.g. '{hostname}_{version}.cfg'
+# 	versioned_config:	True if software version is part of the config file name
+# 	ignore_rules:		lines ignored in config comparison
+# 	license:			True if license of the node can be checked
+# 	artifacts:			artifacts which can be gathered from the node
+Capabilities = namedtuple('Capabilities', ['name', 'config_file', 'versioned_config', 'ignore_rules', 'license', 'artifacts'])
+
+# Node type name: NodeType
+NODE_TYPES = {
+	'switch': NodeType('functions.cisco.switch', 'Cisco switch'),
+	'vepc': NodeType('functions.cisco.vepc', 'Cisco vEPC'),
+	'epg1': NodeType('functions.ericsson.epg1', 'Ericsson EPG 1.X'),
+	'epg2': NodeType('functions.ericsson.epg2', 'Ericsson EPG 2.X'),
+	'mk': NodeType('functions.ericsson.mk', 'Ericsson MK'),
+	'dns': NodeType('functions.dns', 'Bind DNS'),
+}
+
+
+def load_node_type(name):
+	"""
+	Function that imports module of the node type on first use
+
+	Args:
+		name:	node type name in NODE_TYPES (e.g. 'vepc')
+
+	Returns:
+		module of the node type
+	"""
+	if name not in NODE_TYPES:
+		raise ValueError('Unknown node type {} - known types: {}'.format(name, ', '.join(sorted(NODE_TYPES))))
+	return importlib.import_module(NODE_TYPES[name].module)
+
+def node_type_name(node_type):
+	"""Return name of the node type module in NODE_TYPES or module name if not registered"""
+	for name, registered in NODE_TYPES.items():
+		if registered.module == node_type.__name__:
+			return name
+	return node_type.__name__
+
+def capabilities(node_type):
+	"""
+	Function that reads capabilities declared by node type module.
+	Modules without declaration are handled as unversioned config only nodes
+
+	Args:
+		node_type:	module of the node type
+
+	Returns:
+		Capabilities of the node type
+	"""
+	return Capabilities(
+		node_type_name(node_type),
+		getattr(node_type, 'CONFIG_FILE_SCHEME', '{hostname}.cfg'),
+		getattr(node_type, 'VERSIONED_CONFIG', False),
+		getattr(node_type, 'IGNORE_RULES', []),
+		getattr(node_type, 'LICENSE_SUPPORT', False),
+		getattr(node_type, 'ARTIFACTS', [ARTIFACT_CONFIG]),
+	)
+
+def config_version(config_file, hostname, file_name):
+	"""
+	Function that extracts software version from config file name
+
+	Args:
+		config_file:	config file name scheme e.g. '{hostname}_{version}.cfg'
+		hostname:		node's hostname
+		file_name:		config file name e.g. 'vEPC-1_21.28.0.cfg'
+
+	Returns:
+		version or None if file name does not match the scheme
+	"""
+	pattern = re.escape(config_file)
+	pattern = pattern.replace(re.escape('{hostname}'), re.escape(hostname))
+	pattern = pattern.replace(re.escape('{version}'), '(?P<version>.+)')
+	match = re.fullmatch(pattern, file_name)
+	if match is None or 'version' not in match.groupdict():
+		return None
+	return match.group('version')
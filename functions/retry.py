@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+import os
+import json
+import time
+import random
+import threading
+import contextlib
+import contextvars
+
+from functions.git import GIT_PATH
+from functions.variables import INDENT, RETRY_ATTEMPTS, RETRY_BACKOFF, RETRY_BACKOFF_MAX
+from functions.variables import BREAKER_THRESHOLD, BREAKER_COOLDOWN, BREAKER_COOLDOWN_MAX
+
+# Circuit breaker state kept inside .git folder so it is never commited to the repository
+BREAKER_PATH = GIT_PATH + '.git/phoenix-breaker.json'
+
+# Exceptions which usually pass on the next attempt - network hiccups, node busy or restarting
+TRANSIENT_ERRORS = (TimeoutError, ConnectionError, EOFError)
+# Names of exceptions which usually pass on the next attempt - paramiko is loaded lazily
+# so its exceptions are matched by name (e.g. 'Error reading SSH protocol banner')
+TRANSIENT_NAMES = ['SSHException', 'NoValidConnectionsError', 'ChannelException']
+# Names of exceptions which repeat on every attempt e.g. wrong credentials or unknown hostname,
+# checked first as AuthenticationException is subclass of SSHException
+PERMANENT_NAMES = ['AuthenticationException', 'BadAuthenticationType', 'PasswordRequiredException',
+	'BadHostKeyException', 'gaierror']
+
+# Failing hosts - HOSTNAME: {
+# 	'failures':		number of consecutive failed runs
+# 	'last_failure':	time of the last failure (seconds since epoch)
+# 	'last_error':	message of the last error
+# 	'open_until':	time until the host is skipped or None if not skipped yet
+# }
+_breaker = None
+# HOSTNAME: exception logged by node type module during the current attempt
+_errors = {}
+# Monotonic time when deadline of the current host's job passes - set per thread by run_on_hosts()
+_deadline = contextvars.ContextVar('retry_deadline', default=None)
+# Lock protecting breaker state and errors recorded by concurrent backup jobs
+_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def retry_deadline(deadline):
+	"""Context manager giving up retries which would not finish before deadline (monotonic time or None)"""
+	token = _deadline.set(deadline)
+	try:
+		yield
+	finally:
+		_deadline.reset(token)
+
+def record_error(hostname, error):
+	"""
+	Function that remembers exception node type module logged to host's errors log,
+	so retry policy can decide about next attempt although no exception was raised
+
+	Args:
+		hostname:	node's hostname
+		error:		exception caught by node type module
+
+	Returns:
+		None
+	"""
+	with _lock:
+		_errors[hostname] = error
+
+def take_error(hostname):
+	"""Return and forget exception recorded for the host or None"""
+	with _lock:
+		return _errors.pop(hostname, None)
+
+def is_transient(error):
+	"""
+	Function that decides if another attempt can pass
+
+	Args:
+		error:	exception of the failed attempt
+
+	Returns:
+		True for timeouts & connection errors, False for authentication,
+		name resolution and any other errors
+	"""
+	names = [cls.__name__ for cls in type(error).__mro__]
+	if any(name in PERMANENT_NAMES for name in names):
+		return False
+	return isinstance(error, TRANSIENT_ERRORS) or any(name in TRANSIENT_NAMES for name in names)
+
+def backoff_delay(attempt, backoff=RETRY_BACKOFF, backoff_max=RETRY_BACKOFF_MAX):
+	"""
+	Return delay in seconds before next attempt - random part of exponentially
+	growing window, so hosts failing at the same time do not retry at the same time
+	"""
+	return random.uniform(0, min(backoff_max, backoff * 2 ** attempt))
+
+def call_with_retry(hostname, function, *args, attempts=RETRY_ATTEMPTS, backoff=RETRY_BACKOFF, backoff_max=RETRY_BACKOFF_MAX):
+	"""
+	Function that calls node type function (e.g. save_config) again after transient error.
+	Failure is either raised exception or exception recorded by record_error().
+	Hosts which failed during previous runs get single attempt only. Inside retry_deadline()
+	no attempt is started if it would not finish before the host's deadline - the next attempt
+	is expected to take as long as the failed one
+
+	Args:
+		hostname:		node's hostname
+		function:		function to call as function(*args)
+		args:			arguments of the function
+		attempts:		maximal number of attempts (default RETRY_ATTEMPTS)
+		backoff:		base delay in seconds before retry (default RETRY_BACKOFF)
+		backoff_max:	maximal delay in seconds before retry (default RETRY_BACKOFF_MAX)
+
+	Returns:
+		value returned by the last attempt, exception raised by the last attempt is raised
+		and exception recorded by the last attempt is left for take_error()
+	"""
+	if host_failures(hostname):
+		attempts = 1
+	for attempt in range(attempts):
+		take_error(hostname)
+		start = time.monotonic()
+		raised = False
+		try:
+			output = function(*args)
+			error = take_error(hostname)
+		except Exception as e:
+			output = None
+			error = e
+			raised = True
+		if error is None:
+			return output
+		delay = backoff_delay(attempt, backoff, backoff_max)
+		now = time.monotonic()
+		deadline = _deadline.get()
+		retry = attempt + 1 < attempts and is_transient(error)
+		if retry and deadline is not None and now + delay + (now - start) >= deadline:
+			print(INDENT + 'Not retrying {} - host deadline would pass'.format(hostname))
+			retry = False
+		if not retry:
+			if raised:
+				raise error
+			# Error of the last attempt is kept for the host's result
+			record_error(hostname, error)
+			return output
+		print(INDENT + 'Retrying {} in {:.1f} s after {}: {}'.format(hostname, delay, type(error).__name__, error))
+		time.sleep(delay)
+
+def load_breaker():
+	"""
+	Function that loads circuit breaker state from disk if not loaded yet
+
+	Returns:
+		dictionary of failing hosts
+	"""
+	global _breaker
+	with _lock:
+		if _breaker is None:
+			try:
+				with open(BREAKER_PATH, 'r') as f:
+					_breaker = json.load(f)
+			except (OSError, ValueError):
+				_breaker = {}
+		return _breaker
+
+def save_breaker():
+	"""Write circuit breaker state to disk"""
+	hosts = load_breaker()
+	with _lock:
+		tmp_file = BREAKER_PATH + '.tmp'
+		with open(tmp_file, 'w') as f:
+			json.dump(hosts, f, indent=1)
+		os.replace(tmp_file, BREAKER_PATH)
+
+def host_failures(hostname):
+	"""Return number of consecutive failed runs of the host"""
+	hosts = load_breaker()
+	with _lock:
+		return hosts.get(hostname, {}).get('failures', 0)
+
+def breaker_hosts(hosts, now=None):
+	"""
+	Function that orders hosts for the run - healthy hosts first, failing hosts
+	by number of failed runs after them. Hosts failing for BREAKER_THRESHOLD runs
+	are skipped until their cooldown passes, then they get single attempt
+
+	Args:
+		hosts:	dictionary of the nodes containing HOSTNAME:IP_ADDR
+		now:	current time in seconds since epoch (default time.time())
+
+	Returns:
+		dictionary of HOSTNAME:IP_ADDR to run and dictionary of skipped HOSTNAME:open until time
+	"""
+	if now is None:
+		now = time.time()
+	failing = load_breaker()
+	allowed = []
+	skipped = {}
+	with _lock:
+		for index, (hostname, ip) in enumerate(hosts.items()):
+			state = failing.get(hostname, {})
+			if state.get('open_until') is not None and now < state['open_until']:
+				skipped[hostname] = state['open_until']
+			else:
+				allowed.append((state.get('failures', 0), index, hostname, ip))
+	return {hostname: ip for _, _, hostname, ip in sorted(allowed)}, skipped
+
+def record_outcome(hostname, ok, error=None, now=None):
+	"""
+	Function that updates circuit breaker with result of the host's run.
+	Success closes the breaker, every failed run prolongs the cooldown
+
+	Args:
+		hostname:	node's hostname
+		ok:			True if the host's job succeeded
+		error:		error message of the failed job
+		now:		current time in seconds since epoch (default time.time())
+
+	Returns:
+		None
+	"""
+	if now is None:
+		now = time.time()
+	failing = load_breaker()
+	with _lock:
+		if ok:
+			failing.pop(hostname, None)
+			return
+		state = failing.setdefault(hostname, {'failures': 0, 'open_until': None})
+		state['failures'] += 1
+		state['last_failure'] = round(now)
+		state['last_error'] = error
+		if state['failures'] >= BREAKER_THRESHOLD:
+			cooldown = min(BREAKER_COOLDOWN_MAX, BREAKER_COOLDOWN * 2 ** (state['failures'] - BREAKER_THRESHOLD))
+			state['open_until'] = round(now + cooldown)
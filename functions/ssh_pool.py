@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+import time
+import threading
+
+from functions.variables import SSH_PORT, POOL_MAX_PER_HOST, POOL_IDLE_TIMEOUT, POOL_KEEPALIVE
+
+
+class SSHPool:
+	"""
+	Pool of authenticated paramiko SSH connections keyed by (ip, username).
+	Connections are reused by any job connecting to the same node, so key
+	exchange and authentication is paid once per node instead of per command.
+	Each command or interactive session opens its own channel on the shared
+	transport and closes only the channel when done
+	"""
+
+	def __init__(self, max_per_host=POOL_MAX_PER_HOST, idle_timeout=POOL_IDLE_TIMEOUT, keepalive=POOL_KEEPALIVE, port=SSH_PORT):
+		self.port = port
+		self.max_per_host = max_per_host
+		self.idle_timeout = idle_timeout
+		self.keepalive = keepalive
+		# (ip, username): list of (client, time of release) ready for reuse
+		self.idle = {}
+		# (ip, username): number of connections handed out by the pool
+		self.in_use = {}
+		# client: (ip, username) of the connection
+		self.keys = {}
+		self.condition = threading.Condition()
+
+	def acquire(self, ip, username, password, timeout=30, **kwargs):
+		"""
+		Function that returns connected SSH client for given node.
+		Idle connection is reused if available, otherwise new one is opened.
+		Blocks while max_per_host connections to the node are in use
+
+		Args:
+			ip:			node's management ip address
+			username:	user's login to node
+			password:	user's password to node
+			timeout:	connection timeout in seconds (default 30)
+			kwargs:		additional arguments for paramiko SSHClient.connect
+
+		Returns:
+			paramiko SSHClient
+		"""
+		key = (ip, username)
+		with self.condition:
+			self.evict_idle()
+			while True:
+				# Reuse the most recently released connection that is still alive
+				while self.idle.get(key):
+					client, _ = self.idle[key].pop()
+					if client.get_transport() is not None and client.get_transport().is_active():
+						self.in_use[key] = self.in_use.get(key, 0) + 1
+						return client
+					self.discard(client)
+				if self.in_use.get(key, 0) < self.max_per_host:
+					self.in_use[key] = self.in_use.get(key, 0) + 1
+					break
+				if not self.condition.wait(timeout):
+					raise TimeoutError('No free SSH connection to ' + ip)
+
+		# New connection is opened outside of the lock so other nodes are not blocked
+		try:
+			# paramiko is loaded with the first connection, not when scripts start
+			import paramiko
+			client = paramiko.SSHClient()
+			client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+			client.connect(ip, port=self.port, username=username, password=password, timeout=timeout, **kwargs)
+			client.get_transport().set_keepalive(self.keepalive)
+		except Exception:
+			with self.condition:
+				self.in_use[key] -= 1
+				self.condition.notify_all()
+			raise
+		with self.condition:
+			self.keys[client] = key
+		return client
+
+	def release(self, client):
+		"""Return SSH client to the pool for reuse by the next job"""
+		with self.condition:
+			key = self.keys.get(client)
+			if key is None:
+				client.close()
+				return
+			self.in_use[key] -= 1
+			if client.get_transport() is not None and client.get_transport().is_active():
+				self.idle.setdefault(key, []).append((client, time.monotonic()))
+			else:
+				self.discard(client)
+			self.condition.notify_all()
+
+	def discard(self, client):
+		"""Close SSH client and forget it - must be called with the lock held"""
+		self.keys.pop(client, None)
+		client.close()
+
+	def evict_idle(self):
+		"""Close connections idle for longer than idle_timeout - must be called with the lock held"""
+		now = time.monotonic()
+		for key, clients in self.idle.items():
+			for client, released in [c for c in clients if now - c[1] > self.idle_timeout]:
+				clients.remove((client, released))
+				self.discard(client)
+
+	def close_all(self):
+		"""Close all idle connections in the pool"""
+		with self.condition:
+			for clients in self.idle.values():
+				for client, _ in clients:
+					self.discard(client)
+			self.idle.clear()
+
+
+# Connection pool shared by all jobs running in the process
+SSH_POOL = SSHPool()
@@ -1,4 +1,5 @@
 #!/usr/bin/env python3
+import os
 import datetime
 
 TMP_PATH = '/tmp/' # Path to folder where temporary files are stored
@@ -10,18 +11,106 @@ TODAY = datetime.date.today()
 # Indent for CLI logs
 INDENT = '   '
 
+# Number of hosts processed at the same time by backup & license jobs
+WORKERS = 16
+# Overall time limit in seconds for a job over all given hosts
+RUN_DEADLINE = 4 * 3600
+# Time limit in seconds for a job on a single host - retries which would not finish in time are not started
+HOST_DEADLINE = 600
+
 # Messages for config comparison
 COMPARE_CONFIG_IGNORE = INDENT + 'Ignoring - same config in git repo'
 COMPARE_CONFIG_REPLACE = INDENT + 'Replicing file - different config found in git repo'
 COMPARE_CONFIG_ADD = INDENT + 'Adding file - no config present in git repo'
 
+# Artifacts which can be gathered from the nodes
+ARTIFACT_CONFIG = 'config' # Configuration file
+ARTIFACT_VERSION = 'version' # Software version
+ARTIFACT_LICENSE = 'license' # License information
+ARTIFACT_INVENTORY = 'inventory' # Hardware inventory
+
 # Login credentials
 # 	should be kept as secrets
 USERNAME = 'kubebot'
 PASSWORD = 'CHANGE_ME'
 
+# Commit changes of every host separately instead of single daily commit
+PER_HOST_COMMITS = False
+
+# Gather license of license capable nodes in the config backup session and store it
+# 	in LICENSE_CACHE_PATH, so license_alert.py logs in only to nodes close to expiration
+COLLECT_LICENSE = False
+
+# SSH port of the nodes
+SSH_PORT = 22
+
+# Number of SSH connections to a single node kept by connection pool
+POOL_MAX_PER_HOST = 2
+# Time in seconds after which unused pooled SSH connection is closed
+POOL_IDLE_TIMEOUT = 300
+# Interval in seconds of keepalive packets sent on pooled SSH connections
+POOL_KEEPALIVE = 30
+
+# Probe SSH port of all nodes before the run - unreachable nodes are not logged in
+PROBE_ENABLED = True
+# Time limit in seconds for TCP connect and SSH banner of a single node
+PROBE_TIMEOUT = 3
+# Time limit in seconds for probe of all nodes
+PROBE_DEADLINE = 15
+# Read SSH banner - node accepting TCP connection without SSH banner is unreachable
+PROBE_BANNER = True
+# Number of nodes probed at the same time
+PROBE_CONCURRENCY = 512
+
+# Inventory file with node hostname, ip, type, site & tags (.yaml, .csv or .sqlite)
+# 	empty to use node dictionaries at the end of this file
+INVENTORY_PATH = os.environ.get('PHOENIX_INVENTORY', '')
+# Sites & tags of the inventory nodes backed up (separated by spaces) - empty for all nodes
+INVENTORY_SITES = os.environ.get('PHOENIX_SITES', '').split() or None
+INVENTORY_TAGS = os.environ.get('PHOENIX_TAGS', '').split() or None
+# Number of pods (or local processes) the inventory is split to - 1 runs whole inventory
+SHARD_COUNT = int(os.environ.get('PHOENIX_SHARDS', '1'))
+# Shard processed by this pod - index of Kubernetes Indexed Job if set
+SHARD_INDEX = int(os.environ.get('JOB_COMPLETION_INDEX', os.environ.get('PHOENIX_SHARD', '0')))
+# Folder shared by all shards & merge step - every shard stages its changed files there
+STAGE_PATH = os.environ.get('PHOENIX_STAGE_PATH', '/stage/')
+
+# Attempts of the node's backup within single run - only transient errors (e.g. timeout) are retried
+RETRY_ATTEMPTS = 3
+# Base delay in seconds before retry - doubled with every attempt, random part of it is waited
+RETRY_BACKOFF = 5
+# Maximal delay in seconds before retry
+RETRY_BACKOFF_MAX = 60
+# Number of consecutive failed runs after which the node is skipped
+BREAKER_THRESHOLD = 3
+# Time in seconds the failing node is skipped - doubled with every further failed run
+BREAKER_COOLDOWN = 24 * 3600
+# Maximal time in seconds the failing node is skipped
+BREAKER_COOLDOWN_MAX = 7 * 24 * 3600
+
+# Bind DNS files synchronization mode - 'full', 'incremental' or 'archive'
+DNS_SYNC_MODE = 'incremental'
+
 # License file extension
 LICENSE_EXTENSION = '.txt'
+# Number of days before license expiration when notification is sent
+LICENSE_ALERT_DAYS = 30
+# License cache file - kept on persistent git volume between runs
+LICENSE_CACHE_PATH = '/git/license-cache.json'
+# Number of days after which cached license is checked on the node again
+LICENSE_CACHE_MAX_AGE = 7
+# Number of days before alert window when cached license is checked on the node again
+LICENSE_REFRESH_AHEAD = 7
+
+# Run report with duration of every host and phase in JSON format
+METRICS_JSON_PATH = '/git/phoenix-report.json'
+# Run report in Prometheus textfile format read by node_exporter textfile collector
+# 	e.g. /var/lib/node_exporter/textfile_collector/phoenix.prom, empty to skip it
+METRICS_PROM_PATH = os.environ.get('PHOENIX_PROM_PATH', '')
+# Prefix of Prometheus metric names
+METRICS_PREFIX = 'phoenix_backup'
+# Number of the slowest hosts and phases printed at the end of the run
+METRICS_TOP = 10
 
 switches = {
 	'SWITCH_1' : '192.168.0.10',
@@ -35,4 +124,27 @@ vepcs = {
 
 dns = {
 	'DNS' : '192.168.0.240'
-}
\ No newline at end of file
+}
+
+epg1s = {
+}
+
+epg2s = {
+}
+
+mks = {
+}
+
+# Node type name (see functions/registry.py): hosts of the node type backed up
+# by config pipeline - node type module is loaded only if it has any hosts
+CONFIG_NODES = [
+	('vepc', vepcs),
+	('switch', switches),
+	('epg1', epg1s),
+	('epg2', epg2s),
+	('mk', mks),
+]
+# Node type name: hosts of the node type with license checked
+LICENSE_NODES = [
+	('vepc', vepcs),
+]
\ No newline at end of file
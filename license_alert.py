@@ -1,7 +1,10 @@
 from functions.git import *
 from functions.common import *
+from functions.ssh_pool import SSH_POOL
 from functions.variables import *
 from functions.email import *
+from functions.registry import load_node_type
+from functions.license import expiring, render_table, load_license_cache, save_license_cache
 
 # Sender of the mail
 SENDER = 'KubeBot'
@@ -13,17 +16,24 @@ RECIPIENTS_LIST = [
 'change_me@kube.local',
 ]
 
-# List for licenses that will expire soon
-licenses = []
+# Recipient groups - every group gets single digest of expiring licenses of its nodes
+# 	(recipients, dictionary of the group's nodes containing HOSTNAME:IP_ADDR)
+RECIPIENT_GROUPS = [
+	(RECIPIENTS_LIST, vepcs),
+]
+
+# Licenses checked during previous runs
+cache = load_license_cache()
+
+# Nodes of all types in LICENSE_NODES checked in one run - node types without hosts are not loaded
+fleet = [(load_node_type(node_name), hosts) for node_name, hosts in LICENSE_NODES if hosts]
+records = fleet_license_scan(fleet, USERNAME, PASSWORD, WORKERS, RUN_DEADLINE, HOST_DEADLINE, cache)
 
-# vEPC nodes
-licenses.extend(expired_licenses(vepc, vepcs, USERNAME, PASSWORD))
+# Keep checked licenses for the next run
+save_license_cache(cache)
 
-# To create mail HTML body open the file containing 
-# nodes with expiring license in HTML format
-# This file is output from validate_license() function
-with open(TMP_PATH + 'body_table.txt', 'r') as f:
-	body_table = f.read()
+# Nodes with license that will expire soon
+records = expiring(records)
 
 # Body of the email message in HTML format
 BODY = """\
@@ -45,11 +55,29 @@ th {font-family: Calibri; font-size: 13; text-align:left; border-bottom: 1px sol
 
 </body>
 </html>
-""" % (body_table)
+"""
+
+digests = []
+for recipients, hosts in RECIPIENT_GROUPS:
+	group_records = [record for record in records if record.hostname in hosts]
+	# Send email only if any license of the group expires soon
+	if group_records:
+		# HTML formatted table of nodes with expiring license
+		body_table = render_table(group_records)
+		# License files to attach to the mail
+		licenses = [record.license_file for record in group_records]
+		digests.append(Digest(recipients, SUBJECT, BODY % (body_table), licenses))
+
+# All digests are sent in single SMTP session
+if digests:
+	print('Sending {} email(s)'.format(len(digests)))
+	failed = send_digests(SENDER, digests)
+	if failed:
+		print(INDENT + 'ERROR {} of {} email(s) not sent'.format(len(failed), len(digests)))
 
-# Send email
-print('Sending email')
-send_email(SENDER, RECIPIENTS_LIST, SUBJECT, BODY, licenses)
 # Clear temporary files generated by the script
 print('Clearing files temporary created by script')
-clear_temporary_files(LICENSE_EXTENSION)
\ No newline at end of file
+clear_temporary_files(LICENSE_EXTENSION)
+
+# Close SSH connections kept by connection pool
+SSH_POOL.close_all()
\ No newline at end of file
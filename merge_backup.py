@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+import json
+
+from functions.git import *
+from functions.hash_index import refresh_index, save_index
+from functions.changeset import changes_by_host, commit_changes, merge_staged, clear_staged, shard_report
+from functions.inventory import load_inventory, select_nodes
+from functions.metrics import write_report, slowest, import_hosts
+from functions.variables import *
+
+"""
+Script to merge files staged by config_backup.py shards into single commit.
+Should run once all SHARD_COUNT shards finished e.g. as Kubernetes Job started
+after Indexed Job of the shards completed.
+"""
+
+# Set Git global settings inside container
+git_set_global_settings()
+
+# Clone git repository if not present yet, limited to hosts backed up by the shards
+print('---- Preparing git repo')
+nodes = select_nodes(load_inventory(INVENTORY_PATH), sites=INVENTORY_SITES, tags=INVENTORY_TAGS)
+git_bootstrap(GIT_REMOTE_URL, [node.hostname for node in nodes])
+
+# Pull current config files stored in git repository
+print('---- Pulling git repo')
+git_pull()
+# Update hash index of config files with changes pulled from git repository
+refresh_index()
+
+# Apply files staged by all shards to git repository
+print('---- Merging changes staged by {} shards'.format(SHARD_COUNT))
+merged, missing = merge_staged(STAGE_PATH, SHARD_COUNT)
+print(INDENT + 'Merged shards: {}'.format(', '.join(str(shard) for shard in merged) or 'none'))
+if missing:
+	print(INDENT + 'ERROR No staged changes of shards: {}'.format(', '.join(str(shard) for shard in missing)))
+
+# Keep hash index of config files for the next run
+save_index()
+
+# Commit, tag and push only if any file changed during this run
+changes = changes_by_host()
+print('---- Changed files: {} on {} hosts'.format(sum(len(paths) for paths in changes.values()), len(changes)))
+for hostname, paths in changes.items():
+	print(INDENT + '{}: {} files'.format(hostname, len(paths)))
+
+print('---- Commiting changes')
+if commit_changes(DATE, PER_HOST_COMMITS):
+	# Set tag for the commit
+	print('---- Setting daily tag')
+	daily_tag()
+
+	# Push changes to git repository
+	print('---- Pushing changes to git repo')
+	git_push('--follow-tags')
+else:
+	print(INDENT + 'No configuration changes - skipping commit, tag and push')
+
+# Pack refs and objects of the repository if maintenance is due
+stats = git_maintenance()
+if stats is not None:
+	print('---- Repository maintenance: {count} loose objects, {packs} packs, {size-pack} KiB packed, {refs} refs'.format(**stats))
+
+# Hosts of all merged shards are part of the run report
+for shard in merged:
+	try:
+		with open(shard_report(STAGE_PATH, shard), 'r') as f:
+			import_hosts(json.load(f))
+	except (OSError, ValueError):
+		print(INDENT + 'ERROR No run report of shard {}'.format(shard))
+# Staged files are commited, shards of the next run start from clean stage
+clear_staged(STAGE_PATH, merged)
+
+# Report of the run with duration of every host and phase
+report = write_report(METRICS_JSON_PATH, METRICS_PROM_PATH)
+slowest_hosts, slowest_phases = slowest(report, METRICS_TOP)
+print('---- Run finished in {:.1f} s, the slowest hosts:'.format(report['duration']))
+for hostname, duration in slowest_hosts:
+	print(INDENT + '{}: {:.1f} s'.format(hostname, duration))
+print('---- The slowest phases:')
+for hostname, name, seconds in slowest_phases:
+	print(INDENT + '{} {}: {:.1f} s'.format(hostname, name, seconds))
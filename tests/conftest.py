@@ -0,0 +1,7 @@
+#!/usr/bin/env python3
+import os
+import tempfile
+
+# Modules in functions/ read the git repository path on import - tests never touch /git/config/
+os.environ.setdefault('PHOENIX_GIT_PATH', tempfile.mkdtemp(prefix='phoenix-test-') + '/')
+os.makedirs(os.environ['PHOENIX_GIT_PATH'] + '.git/', exist_ok=True)
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+import pytest
+from paramiko_expect import SSHClientInteraction
+
+from functions.capture import capture_to_file
+from functions.expect import expect
+
+PROMPT = '.*sw1#.*'
+# Output of 'show running-config' as sent by the switch incl. command echo, CR and ANSI sequences
+STREAM = ('show running-config\r\nBuilding configuration...\r\n\r\nCurrent configuration : 42 bytes\r\n'
+	'hostname sw1\r\n\x1b[Kinterface Gi0/1\r\n description uplink é\r\n!\r\nend\r\n\r\nsw1#').encode('utf-8')
+# Login of the switch in user mode followed by enable and 'show version'
+SESSION = [
+	(['.*sw1>.*', PROMPT], None, b'\r\nUser Access Verification\r\n\r\nsw1>'),
+	('Password: ', 'enable', b'enable\r\nPassword: '),
+	(PROMPT, 'secret', b'\r\nsw1#'),
+	(PROMPT, 'show version', b'show version\r\nCisco IOS Software\r\n\x1b[1mUptime\x1b[0m is 1 day\r\nsw1#'),
+]
+
+
+class FakeChannel:
+	"""Channel replaying the stream in given chunks"""
+
+	def __init__(self, chunks):
+		self.chunks = list(chunks)
+		self.closed = False
+
+	def settimeout(self, timeout):
+		pass
+
+	def send_ready(self):
+		return True
+
+	def send(self, data):
+		return len(data)
+
+	def recv_ready(self):
+		return True
+
+	def recv(self, size):
+		return self.chunks.pop(0) if self.chunks else b''
+
+
+def interaction(chunks):
+	"""Return SSHClientInteraction driving fake channel with default settings"""
+	interact = SSHClientInteraction.__new__(SSHClientInteraction)
+	interact.__dict__.update(channel=FakeChannel(chunks), timeout=60, newline='\r', buffer_size=1024,
+		display=False, encoding='utf-8', output_callback=None, lines_to_check=1, current_output='',
+		current_output_clean='', current_send_string='', last_match='')
+	interact.decoder = None
+	return interact
+
+def split(data, size):
+	return [data[index:index + size] for index in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize('size', [len(STREAM), 1, 7, 64])
+def test_capture_is_same_as_current_output_clean(tmp_path, size):
+	baseline = interaction(split(STREAM, size))
+	baseline.send('show running-config')
+	baseline.expect(PROMPT)
+
+	interact = interaction(split(STREAM, size))
+	written = capture_to_file(interact, 'show running-config', PROMPT, str(tmp_path / 'sw1.cfg'))
+	with open(tmp_path / 'sw1.cfg', 'r') as f:
+		captured = f.read()
+	assert captured == baseline.current_output_clean
+	assert written == len(captured)
+	assert interact.last_match == PROMPT
+
+
+@pytest.mark.parametrize('size', [1, 5, 1024])
+def test_expect_is_same_as_expect_of_interaction(size):
+	for prompts, command, stream in SESSION:
+		baseline = interaction(split(stream, size))
+		interact = interaction(split(stream, size))
+		if command is not None:
+			baseline.send(command)
+			interact.send(command)
+		assert expect(interact, prompts) == baseline.expect(prompts)
+		assert interact.current_output == baseline.current_output
+		assert interact.current_output_clean == baseline.current_output_clean
+		assert interact.last_match == baseline.last_match
+		assert interact.current_send_string == ''
+
+def test_expect_raises_when_connection_is_closed():
+	interact = interaction([b'show version\r\nCisco IOS Software\r\n'])
+	with pytest.raises(ConnectionError):
+		expect(interact, PROMPT)
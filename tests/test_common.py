@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+import time
+
+from functions.common import run_on_hosts
+
+
+def sleeper(seconds):
+	"""Return job sleeping given seconds of every host"""
+	def job(hostname, ip):
+		time.sleep(seconds[hostname])
+		return hostname
+	return job
+
+def test_host_started_later_is_limited_by_its_deadline():
+	# Single worker - host 'b' starts only when thread of timed out host 'a' is free again
+	job = sleeper({'a': 1.5, 'b': 4})
+	start = time.monotonic()
+	results = run_on_hosts(job, {'a': '1', 'b': '2'}, workers=1, deadline=None, host_deadline=1)
+	assert [result.status for result in results] == ['timeout', 'timeout']
+	assert time.monotonic() - start < 3
+
+def test_hosts_within_deadline_are_ok():
+	job = sleeper({'a': 0.1, 'b': 0.1, 'c': 0.1})
+	results = run_on_hosts(job, {'a': '1', 'b': '2', 'c': '3'}, workers=2, host_deadline=1)
+	assert [(result.hostname, result.status, result.output) for result in results] == [
+		('a', 'ok', 'a'), ('b', 'ok', 'b'), ('c', 'ok', 'c')]
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+import functions.compare as compare
+from functions.compare import compare_and_store, unified_diff, CONFIG_SAME, CONFIG_CHANGED, CONFIG_ADDED
+
+
+def write(path, content):
+	path.write_text(content)
+	return str(path)
+
+def test_unified_diff_skips_ignored_lines(tmp_path):
+	old = write(tmp_path / 'old.cfg', 'hostname sw1\n+B 1234\ninterface Gi0/1\n')
+	new = write(tmp_path / 'new.cfg', 'hostname sw1\n+B 5678\ninterface Gi0/2\n')
+	assert unified_diff(new, old, ['+B']) == ['--- ' + old, '+++ ' + new, '@@ -1,2 +1,2 @@',
+		' hostname sw1', '-interface Gi0/1', '+interface Gi0/2']
+
+def test_diff_is_printed_only_for_changed_config(tmp_path, monkeypatch, capsys):
+	repo = tmp_path / 'repo'
+	repo.mkdir()
+	write(repo / 'sw1.cfg', 'hostname sw1\n+B 1234\n')
+	monkeypatch.setattr(compare, 'DIFF_MAX_LINES', 5)
+
+	assert compare_and_store(write(tmp_path / 'sw1.cfg', 'hostname sw1\n+B 5678\n'), str(repo) + '/', 'sw1.cfg', ['+B']) == CONFIG_SAME
+	assert '@@' not in capsys.readouterr().out
+
+	config = 'hostname sw1\n+B 5678\n' + ''.join('vlan {}\n'.format(vlan) for vlan in range(5))
+	assert compare_and_store(write(tmp_path / 'sw1.cfg', config), str(repo) + '/', 'sw1.cfg', ['+B']) == CONFIG_CHANGED
+	out = capsys.readouterr().out
+	assert '@@ -1 +1,6 @@' in out and '+vlan 0' in out and '... 4 more lines' in out and '+B' not in out
+	assert (repo / 'sw1.cfg').read_text() == config
+
+	assert compare_and_store(write(tmp_path / 'sw1_2.cfg', config), str(repo) + '/', 'sw1.cfg', ['+B']) == CONFIG_ADDED
+	assert '@@' not in capsys.readouterr().out
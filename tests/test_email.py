@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+import io
+import socket
+import threading
+
+import pytest
+
+from functions.email import Digest, Mailer, send_digests
+from functions.variables import TMP_PATH
+
+
+class FakeSMTPServer:
+	"""Minimal SMTP relay accepting AUTH PLAIN and storing received messages"""
+
+	def __init__(self):
+		self.sock = socket.socket()
+		self.sock.bind(('127.0.0.1', 0))
+		self.sock.listen(5)
+		self.port = self.sock.getsockname()[1]
+		self.messages = []
+		threading.Thread(target=self.accept, daemon=True).start()
+
+	def accept(self):
+		while True:
+			try:
+				connection, _ = self.sock.accept()
+			except OSError:
+				return
+			threading.Thread(target=self.session, args=(connection,), daemon=True).start()
+
+	def session(self, connection):
+		stream = connection.makefile('rb')
+		connection.sendall(b'220 fake\r\n')
+		for line in stream:
+			command = line.strip().upper()
+			if command.startswith(b'EHLO'):
+				connection.sendall(b'250-fake\r\n250 AUTH PLAIN\r\n')
+			elif command.startswith(b'AUTH'):
+				connection.sendall(b'235 ok\r\n')
+			elif command == b'DATA':
+				connection.sendall(b'354 go\r\n')
+				data = b''
+				while not data.endswith(b'\r\n.\r\n'):
+					data += stream.readline()
+				self.messages.append(data)
+				connection.sendall(b'250 queued\r\n')
+			elif command == b'QUIT':
+				connection.sendall(b'221 bye\r\n')
+				break
+			else:
+				connection.sendall(b'250 ok\r\n')
+		connection.close()
+
+	def close(self):
+		self.sock.close()
+
+
+def test_missing_attachment_fails_only_its_digest():
+	server = FakeSMTPServer()
+	try:
+		with open(TMP_PATH + 'phoenix-test-license.txt', 'w') as f:
+			f.write('license\n')
+		digests = [
+			Digest(['a@kube.local'], 'first', '<p>first</p>', ['phoenix-test-missing.txt']),
+			Digest(['b@kube.local'], 'second', '<p>second</p>', ['phoenix-test-license.txt']),
+		]
+		failed = send_digests('bot@kube.local', digests, '127.0.0.1', server.port, 'user', 'password')
+		assert failed == digests[:1]
+		assert len(server.messages) == 1
+		assert b'filename="phoenix-test-license.txt"' in server.messages[0]
+	finally:
+		server.close()
+
+class BrokenFile(io.RawIOBase):
+	"""Attachment failing while the message is written"""
+
+	def read(self, size=-1):
+		raise OSError('read failed')
+
+
+def test_error_in_data_mode_drops_session():
+	server = FakeSMTPServer()
+	try:
+		with Mailer('127.0.0.1', server.port, 'user', 'password', timeout=5) as mailer:
+			with pytest.raises(OSError):
+				mailer.send_files('bot@kube.local', ['a@kube.local'], 'broken', '<p/>', [('broken.txt', BrokenFile())])
+			assert mailer.smtp is None
+			mailer.send('bot@kube.local', ['b@kube.local'], 'next', '<p>next</p>')
+		assert len(server.messages) == 1
+	finally:
+		server.close()
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+import subprocess
+
+import functions.git as git
+
+IDENTITY = ['-c', 'user.name=test', '-c', 'user.email=test@local']
+
+
+def run_git(path, *args):
+	result = subprocess.run(['git', '-C', str(path)] + IDENTITY + list(args),
+		stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+	return result.stdout.decode('utf-8').strip()
+
+def commit_file(path, name, content):
+	with open(path / name, 'w') as f:
+		f.write(content)
+	run_git(path, 'add', name)
+	run_git(path, 'commit', '-q', '-m', name)
+
+def test_partial_clone_packs_are_consolidated(tmp_path, monkeypatch):
+	origin = tmp_path / 'origin'
+	origin.mkdir()
+	run_git(origin, 'init', '-q')
+	run_git(origin, 'config', 'uploadpack.allowFilter', 'true')
+	for index in range(3):
+		commit_file(origin, 'node-{}.cfg'.format(index), 'hostname node-{}\n'.format(index))
+	clone = tmp_path / 'clone'
+	run_git(tmp_path, 'clone', '-q', '--filter=blob:none', 'file://' + str(origin), str(clone))
+	monkeypatch.setattr(git, 'GIT_PATH', str(clone) + '/')
+	monkeypatch.setattr(git, 'MAINTENANCE_STAMP', str(clone) + '/.git/phoenix-maintenance')
+	assert git.git_output('config', '--get', 'remote.origin.promisor') == 'true'
+
+	packs = []
+	for index in range(6):
+		commit_file(clone, 'backup-{}.cfg'.format(index), 'hostname backup-{}\n'.format(index))
+		packs.append(git.git_maintenance(force=True, max_packs=3)['packs'])
+	# New pack is added by every run until the threshold consolidates them
+	assert max(packs) <= 3
+	assert packs[-1] < packs[-2]
+	# Objects of the clone stay complete and missing blobs are still fetched from the promisor remote
+	run_git(clone, 'fsck', '--connectivity-only')
+	assert run_git(clone, 'show', 'HEAD:node-0.cfg') == 'hostname node-0'
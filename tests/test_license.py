@@ -0,0 +1,17 @@
+#!/usr/bin/env python3
+import datetime
+
+from functions.cisco import vepc
+
+LICENSE = ('Key Information (installed key):\n'
+	'  Comment           vEPC license\n'
+	'  Grace Expire: none\n'
+	'  Session Expire March 05 00:00:00 UTC 2031\n'
+	'  Session Expire January 12 00:00:00 UTC 2030\n')
+
+
+def test_vepc_expire_date_is_read_from_single_line():
+	assert vepc.license_expire_date(LICENSE) == datetime.date(2030, 1, 12)
+
+def test_vepc_line_without_date_is_skipped():
+	assert vepc.license_expire_date('  Grace Expire: none\n  Comment  Session none 200 x y z\n') is None